@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import redis
+from loguru import logger
+from prometheus_client import Counter
+
+# Metrics
+cache_hits = Counter("rag_answer_cache_hits_total",
+                     "Answers served from the answer cache", ["kind"])
+cache_misses = Counter("rag_answer_cache_misses_total",
+                       "Queries not found in the answer cache")
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 300))
+# Cosine similarity above which a cached answer is reused for a reworded question; 0 disables
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0))
+# How long a process trusts its last read of the shared ingestion epoch
+EPOCH_REFRESH_SECONDS = float(os.getenv("EPOCH_REFRESH_SECONDS", 1))
+# After Redis fails, how long the epoch is reported unknown before Redis is tried again
+EPOCH_BACKOFF_SECONDS = float(os.getenv("EPOCH_BACKOFF_SECONDS", 5))
+
+REDIS_URL = os.getenv("REDIS_URL", os.getenv(
+    "CELERY_BROKER_URL", "redis://redis:6379/0"))
+EPOCH_KEY = "rag:ingestion_epoch"
+
+_redis = redis.Redis.from_url(
+    REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+_epoch_cache = (0.0, 0)
+_redis_retry_at = 0.0
+_epoch_lock = threading.Lock()
+
+
+def _epoch_unavailable(e):
+    # Called with _epoch_lock held
+    global _epoch_cache, _redis_retry_at
+    logger.warning(f"Ingestion epoch unavailable, retrying Redis in {EPOCH_BACKOFF_SECONDS}s: {e}")
+    _redis_retry_at = time.monotonic() + EPOCH_BACKOFF_SECONDS
+    _epoch_cache = (0.0, None)
+
+
+def bump_ingestion_epoch():
+    """
+    Mark the indexed data as changed so every cached answer becomes stale.
+
+    The epoch lives in Redis so that the Celery workers, REST, WebSocket and
+    Streamlit processes all see the same value. Returns None if Redis is unreachable.
+    """
+    global _epoch_cache
+    with _epoch_lock:
+        try:
+            epoch = int(_redis.incr(EPOCH_KEY))
+        except redis.RedisError as e:
+            _epoch_unavailable(e)
+            return None
+        _epoch_cache = (time.monotonic(), epoch)
+        return epoch
+
+
+def get_ingestion_epoch():
+    """
+    Shared ingestion epoch, re-read from Redis at most every EPOCH_REFRESH_SECONDS.
+
+    Returns None while it is unknown, i.e. for EPOCH_BACKOFF_SECONDS after a Redis
+    failure, so an outage costs one socket timeout per backoff rather than per
+    refresh. Callers must not serve anything cached under an unknown epoch: a bump
+    made by another process would go unnoticed.
+    """
+    global _epoch_cache
+    read_at, epoch = _epoch_cache
+    now = time.monotonic()
+    if now - read_at < EPOCH_REFRESH_SECONDS:
+        return epoch
+    if now < _redis_retry_at:
+        return None
+    with _epoch_lock:
+        read_at, epoch = _epoch_cache
+        now = time.monotonic()
+        if now - read_at < EPOCH_REFRESH_SECONDS:
+            return epoch
+        if now < _redis_retry_at:
+            return None
+        try:
+            epoch = int(_redis.get(EPOCH_KEY) or 0)
+        except redis.RedisError as e:
+            _epoch_unavailable(e)
+            return None
+        _epoch_cache = (time.monotonic(), epoch)
+        return epoch
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class AnswerCache:
+    """
+    Bounded LRU/TTL cache of generated answers keyed on (ingestion epoch, normalized question).
+
+    Entries can optionally carry the question's embedding so that a reworded
+    question can reuse an answer through find_similar().
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, question: str, epoch: int):
+        key = (epoch, normalize_question(question))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            answer, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return answer
+
+    def find_similar(self, vector, epoch: int, threshold: float):
+        now = time.monotonic()
+        with self.lock:
+            candidates = [(key, entry) for key, entry in self.entries.items()
+                          if key[0] == epoch and entry[2] is not None and entry[1] >= now]
+        if not candidates:
+            return None
+        matrix = np.stack([entry[2] for _, entry in candidates])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return candidates[best][1][0]
+
+    def put(self, question: str, epoch: int, answer: str, vector=None):
+        key = (epoch, normalize_question(question))
+        with self.lock:
+            self.entries[key] = (answer, time.monotonic() + self.ttl, vector)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def unit_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,130 @@
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
+from haystack import component
+from prometheus_client import Counter, Histogram
+
+# Metrics
+embedding_batch_size = Histogram("rag_embedding_batch_size", "Query texts embedded per forward pass",
+                                 buckets=(1, 2, 4, 8, 16, 32, 64))
+embedding_wait = Histogram("rag_embedding_wait_seconds",
+                           "Time a query embedding spent queued before its batch started",
+                           buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+embedding_cache = Counter("rag_embedding_cache_total", "Query embedding lookups in the vector LRU",
+                          ["outcome"])
+
+
+@component
+class MicroBatchEmbedder:
+    """
+    Drop-in for a text embedder that embeds concurrent queries in one batched call.
+
+    Callers block while a background thread collects the texts arriving within
+    `max_wait_ms` of the first one (or until `max_batch_size` are queued), embeds
+    them with a single forward pass and hands each vector back. The last
+    `cache_size` vectors are kept in an LRU keyed by the exact text.
+
+    The wrapped embedder's `embedding_backend.embed()` (SentenceTransformersTextEmbedder
+    after warm_up) is used for batching; embedders without one are called per text.
+    """
+
+    def __init__(self, embedder, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 cache_size: int = 1024):
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.pending = queue.Queue()
+        self.worker = None
+
+    def warm_up(self):
+        if hasattr(self.embedder, "warm_up"):
+            self.embedder.warm_up()
+
+    def embed_batch(self, texts):
+        backend = getattr(self.embedder, "embedding_backend", None)
+        if backend is None:
+            return [self.embedder.run(text=text)["embedding"] for text in texts]
+        e = self.embedder
+        return backend.embed(
+            [getattr(e, "prefix", "") + text + getattr(e, "suffix", "") for text in texts],
+            batch_size=max(getattr(e, "batch_size", 32), len(texts)),
+            show_progress_bar=False,
+            normalize_embeddings=getattr(e, "normalize_embeddings", False),
+            precision=getattr(e, "precision", "float32"),
+            **(getattr(e, "encode_kwargs", None) or {}),
+        )
+
+    def _cached(self, text):
+        with self.lock:
+            embedding = self.cache.get(text)
+            if embedding is not None:
+                self.cache.move_to_end(text)
+            return embedding
+
+    def _remember(self, text, embedding):
+        if self.cache_size <= 0:
+            return
+        with self.lock:
+            self.cache[text] = embedding
+            self.cache.move_to_end(text)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _ensure_worker(self):
+        # Started on first use so a process that forks after preloading the model
+        # gets its own thread in every child
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run_batches, name="embedding-batcher",
+                                               daemon=True)
+                self.worker.start()
+
+    def _next_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.pending.get(timeout=remaining) if remaining > 0
+                             else self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batches(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                embedding_wait.observe(started - queued_at)
+            # Identical texts in one batch are embedded once
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            embedding_batch_size.observe(len(texts))
+            try:
+                vectors = dict(zip(texts, self.embed_batch(texts)))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for text, vector in vectors.items():
+                self._remember(text, vector)
+            for text, future, _ in batch:
+                future.set_result(vectors[text])
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        embedding = self._cached(text)
+        if embedding is not None:
+            embedding_cache.labels(outcome="hit").inc()
+            return {"embedding": embedding}
+        embedding_cache.labels(outcome="miss").inc()
+        future = Future()
+        self._ensure_worker()
+        self.pending.put((text, future, time.perf_counter()))
+        return {"embedding": future.result()}
@@ -0,0 +1,310 @@
+"""
+Local stand-ins for every external service the agent talks to.
+
+FakeUpstreamServer serves CoinGecko, CMC, Binance, Santiment and two
+OpenAI-compatible chat completions endpoints (OpenAI and OpenRouter) from one
+threaded HTTP server, each under its own path prefix and with its own
+latency/error profile. The fake
+embedders replace the sentence-transformers models in-process, and
+FakeEpochRedis holds the shared ingestion epoch.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from haystack import Document, component
+
+SERVICES = ("coingecko", "cmc", "binance", "santiment", "openai", "openrouter")
+
+GRAPHQL_ALIAS = re.compile(r"(\w+):\s*getMetric\(metric:\s*\$(\w+)\)\s*\{\s*timeseriesData\(slug:\s*\$(\w+)")
+
+INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1h": 3_600_000,
+               "4h": 14_400_000, "1d": 86_400_000}
+
+MAJOR_COINS = [("bitcoin", "btc", "Bitcoin"), ("ethereum", "eth", "Ethereum"),
+               ("solana", "sol", "Solana"), ("ripple", "xrp", "XRP"),
+               ("binancecoin", "bnb", "BNB"), ("dogecoin", "doge", "Dogecoin"),
+               ("cardano", "ada", "Cardano"), ("tron", "trx", "TRON")]
+
+
+@dataclass
+class ServiceProfile:
+    """Latency and failure behaviour of one fake upstream."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    # Slow tail: chance that a request takes an extra slow_ms
+    slow_rate: float = 0.0
+    slow_ms: float = 0.0
+    # Santiment only: chance that one alias of a batched GraphQL query errors
+    partial_error_rate: float = 0.0
+    # Chat completions only: delay between streamed tokens, and tokens per completion
+    token_ms: float = 0.0
+    completion_tokens: int = 120
+
+    def delay(self):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if random.random() < self.slow_rate:
+            latency += self.slow_ms
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def fails(self):
+        return random.random() < self.error_rate
+
+
+def fake_coins(n_coins):
+    coins = list(MAJOR_COINS[:n_coins])
+    coins += [(f"coin-{i}", f"c{i}", f"Coin {i}")
+              for i in range(len(coins), n_coins)]
+    return [{"id": slug, "symbol": symbol, "name": name} for slug, symbol, name in coins]
+
+
+def fake_klines(symbol, interval, limit, start_time=None):
+    step = INTERVAL_MS.get(interval, 300_000)
+    now = int(time.time() * 1000)
+    live_open = now // step * step
+    first_open = live_open - (limit - 1) * step
+    if start_time is not None:
+        first_open = max(int(start_time) // step * step, live_open - 999 * step)
+        if int(start_time) % step:
+            first_open += step
+    opens = np.arange(first_open, live_open + 1, step)[:limit]
+    rng = np.random.default_rng(zlib.crc32(f"{symbol}{interval}".encode()))
+    base = 10 + rng.random() * 1000
+    # Price path is a function of open time so incremental fetches stay consistent
+    closes = base * (1 + 0.02 * np.sin(opens / (step * 37.0)) + 0.01 * np.cos(opens / (step * 11.0)))
+    return [[int(o), f"{c:.6f}", f"{c * 1.002:.6f}", f"{c * 0.998:.6f}", f"{c:.6f}", "1000.0",
+             int(o + step - 1), "0", 100, "0", "0", "0"] for o, c in zip(opens, closes)]
+
+
+class FakeUpstreamServer:
+    """
+    Threaded HTTP server emulating the upstream APIs on 127.0.0.1.
+
+    URLs: {url}/coingecko/api/v3/coins/markets, {url}/cmc/v1/cryptocurrency/listings/latest,
+    {url}/binance/api/v3/klines, {url}/santiment/graphql, {url}/openai/v1/chat/completions,
+    {url}/openrouter/api/v1/chat/completions.
+    """
+
+    def __init__(self, profiles: Dict[str, ServiceProfile] = None, n_coins: int = 50):
+        self.profiles = {name: ServiceProfile() for name in SERVICES}
+        self.profiles.update(profiles or {})
+        self.n_coins = n_coins
+        self.requests = {name: 0 for name in SERVICES}
+        self.cancelled = {name: 0 for name in SERVICES}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload, status=200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                service = parsed.path.strip("/").split("/", 1)[0]
+                if service not in server.profiles:
+                    return self._json({"error": "not found"}, 404)
+                with server.lock:
+                    server.requests[service] += 1
+                # Read the body first so an injected failure leaves the keep-alive connection usable
+                body = None
+                if method == "POST":
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                profile = server.profiles[service]
+                profile.delay()
+                if profile.fails():
+                    return self._json({"error": "injected failure"}, 503)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                getattr(self, f"_{service}")(params, body, profile)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def _coingecko(self, params, body, profile):
+                self._json(fake_coins(min(server.n_coins, int(params.get("per_page", 50)))))
+
+            def _cmc(self, params, body, profile):
+                coins = fake_coins(min(server.n_coins, int(params.get("limit", 50))))
+                self._json({"data": [{"symbol": c["symbol"].upper(), "tags": []} for c in coins]})
+
+            def _binance(self, params, body, profile):
+                self._json(fake_klines(params.get("symbol", ""), params.get("interval", "5m"),
+                                       min(int(params.get("limit", 500)), 1000), params.get("startTime")))
+
+            def _santiment(self, params, body, profile):
+                variables = body.get("variables") or {}
+                data, errors = {}, []
+                for alias, metric_var, slug_var in GRAPHQL_ALIAS.findall(body.get("query", "")):
+                    if random.random() < profile.partial_error_rate:
+                        data[alias] = None
+                        errors.append({"message": "injected alias failure", "path": [alias]})
+                        continue
+                    seed = zlib.crc32(f"{variables.get(slug_var)}{variables.get(metric_var)}".encode())
+                    value = round(random.Random(seed).uniform(-5, 5), 4)
+                    data[alias] = {"timeseriesData": [{"datetime": "2026-01-01T00:00:00Z", "value": value}]}
+                self._json({"data": data, **({"errors": errors} if errors else {})})
+
+            def _openai(self, params, body, profile, service="openai"):
+                words = ["The", "trend", "looks", "constructive", "while", "RSI", "stays", "below", "70."]
+                tokens = [f" {words[i % len(words)]}" for i in range(profile.completion_tokens)]
+                model = body.get("model", "fake-model")
+                usage = {"prompt_tokens": 500, "completion_tokens": len(tokens), "total_tokens": 500 + len(tokens)}
+                if not body.get("stream"):
+                    time.sleep(profile.token_ms * len(tokens) / 1000)
+                    return self._json({
+                        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                        "model": model, "usage": usage,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(tokens)}}],
+                    })
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for i, token in enumerate(tokens + [None]):
+                        chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                                 "created": int(time.time()), "model": model,
+                                 "choices": [{"index": 0, "delta": {"content": token} if token else {},
+                                              "finish_reason": None if token else "stop"}]}
+                        if token is None and body.get("stream_options", {}).get("include_usage"):
+                            chunk["usage"] = usage
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                        if token and profile.token_ms:
+                            time.sleep(profile.token_ms / 1000)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the request (e.g. it lost a hedged race)
+                    with server.lock:
+                        server.cancelled[service] += 1
+
+            def _openrouter(self, params, body, profile):
+                self._openai(params, body, profile, service="openrouter")
+
+        return Handler
+
+
+class FakeEpochRedis:
+    """In-process stand-in for the Redis client answer_cache keeps the ingestion epoch in."""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.values.get(key)
+        return None if value is None else str(value).encode()
+
+    def incr(self, key):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + 1
+            return self.values[key]
+
+
+def fake_embedding(text, dim=384):
+    rng = np.random.default_rng(zlib.crc32((text or "").encode()))
+    vector = rng.normal(size=dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddingBackend:
+    """
+    Stand-in for the sentence-transformers backend: a forward pass costs a fixed
+    `latency_ms` plus `per_text_ms` for each text in the batch, and passes run one
+    at a time, like a CPU model that already uses every core.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, per_text_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def embed(self, data: List[str], **kwargs):
+        with self.lock:
+            self.calls += 1
+            time.sleep((self.latency_ms + self.per_text_ms * len(data)) / 1000)
+        return [fake_embedding(text) for text in data]
+
+
+@component
+class FakeTextEmbedder:
+    """Drop-in for SentenceTransformersTextEmbedder with a fixed per-call cost."""
+
+    def __init__(self, latency_ms: float = 0.0, per_text_ms: float = 0.0):
+        self.embedding_backend = FakeEmbeddingBackend(latency_ms, per_text_ms)
+
+    def warm_up(self):
+        pass
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        return {"embedding": self.embedding_backend.embed([text])[0]}
+
+
+@component
+class FakeDocumentEmbedder:
+    """Drop-in for SentenceTransformersDocumentEmbedder with a fixed per-document cost."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    def warm_up(self):
+        pass
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        time.sleep(self.latency_ms * len(documents) / 1000)
+        for doc in documents:
+            doc.embedding = fake_embedding(doc.content)
+        return {"documents": documents}
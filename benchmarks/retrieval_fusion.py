@@ -0,0 +1,141 @@
+"""
+Offline recall/latency comparison of the hybrid retrieval stage against the old chained wiring.
+
+The corpus, embedder and retriever latencies are synthetic so the comparison runs
+without Weaviate or a model download:
+
+    python -m benchmarks.retrieval_fusion --docs 2000 --queries 200 --latency-ms 5
+"""
+import argparse
+import json
+import time
+import zlib
+import numpy as np
+from haystack import Document, component
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.components.retrievers.in_memory import InMemoryBM25Retriever, InMemoryEmbeddingRetriever
+from hybrid_retrieval import HybridRetriever
+
+DIM = 64
+
+
+@component
+class TopicEmbedder:
+    """Deterministic stand-in for MiniLM: words of one topic share most of their vector."""
+
+    def __init__(self, word_topics, topic_vectors):
+        self.word_topics = word_topics
+        self.topic_vectors = topic_vectors
+
+    def embed(self, text):
+        vectors = []
+        for word in text.split():
+            rng = np.random.default_rng(zlib.crc32(word.encode()))
+            word_vector = rng.normal(size=DIM) * 0.5
+            topic = self.word_topics.get(word)
+            if topic is not None:
+                word_vector += self.topic_vectors[topic]
+            vectors.append(word_vector)
+        vector = np.mean(vectors, axis=0) if vectors else np.zeros(DIM)
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    @component.output_types(embedding=list)
+    def run(self, text: str):
+        return {"embedding": self.embed(text)}
+
+
+class Delayed:
+    """Adds a fixed round-trip latency to a retriever's run(), like a remote vector DB."""
+
+    def __init__(self, retriever, latency):
+        self.retriever = retriever
+        self.latency = latency
+
+    def run(self, **kwargs):
+        time.sleep(self.latency)
+        return self.retriever.run(**kwargs)
+
+
+def build_corpus(n_docs, n_topics, words_per_topic, rng):
+    vocabulary = {t: [f"t{t}w{i}" for i in range(words_per_topic)]
+                  for t in range(n_topics)}
+    word_topics = {w: t for t, words in vocabulary.items() for w in words}
+    topic_vectors = rng.normal(size=(n_topics, DIM))
+    embedder = TopicEmbedder(word_topics, topic_vectors)
+    documents = []
+    for i in range(n_docs):
+        topic = int(rng.integers(n_topics))
+        words = list(rng.choice(vocabulary[topic], size=30)) + \
+            [f"common{int(x)}" for x in rng.integers(50, size=10)]
+        content = " ".join(words)
+        documents.append(Document(id=f"doc-{i}", content=content, meta={"topic": topic},
+                                  embedding=embedder.embed(content)))
+    return documents, vocabulary, embedder
+
+
+def make_queries(documents, vocabulary, n_queries, rng):
+    queries = []
+    for i in rng.choice(len(documents), size=n_queries, replace=False):
+        doc = documents[int(i)]
+        exact = list(rng.choice(doc.content.split()[:30], size=3))
+        paraphrase = list(
+            rng.choice(vocabulary[doc.meta["topic"]], size=3))
+        queries.append((" ".join(exact + paraphrase), doc.id))
+    return queries
+
+
+def evaluate(name, retrieve, queries, top_k):
+    hits = 0
+    latencies = []
+    for text, relevant_id in queries:
+        started = time.perf_counter()
+        documents = retrieve(text)[:top_k]
+        latencies.append(time.perf_counter() - started)
+        hits += any(doc.id == relevant_id for doc in documents)
+    latencies = np.array(latencies) * 1000
+    return {
+        "wiring": name,
+        f"recall@{top_k}": round(hits / len(queries), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0,
+                        help="simulated round-trip per retriever call")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    documents, vocabulary, embedder = build_corpus(
+        args.docs, args.topics, 200, rng)
+    store = InMemoryDocumentStore(embedding_similarity_function="cosine")
+    store.write_documents(documents)
+    latency = args.latency_ms / 1000
+    bm25 = Delayed(InMemoryBM25Retriever(document_store=store), latency)
+    dense = Delayed(InMemoryEmbeddingRetriever(document_store=store), latency)
+    queries = make_queries(documents, vocabulary, args.queries, rng)
+
+    def chained(text):
+        # Old wiring: BM25 runs first, then the embedding retriever's results go to the prompt
+        bm25.run(query=text, top_k=args.top_k)
+        embedding = embedder.run(text=text)["embedding"]
+        return dense.run(query_embedding=embedding, top_k=args.top_k)["documents"]
+
+    results = [evaluate("chained", chained, queries, args.top_k)]
+    for join_mode in ("reciprocal_rank_fusion", "weighted"):
+        hybrid = HybridRetriever(bm25, dense, embedder, top_k=args.top_k,
+                                 candidates=2 * args.top_k, join_mode=join_mode)
+        results.append(evaluate(f"hybrid_{join_mode}",
+                                lambda text: hybrid.run(query=text)["documents"], queries, args.top_k))
+    print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
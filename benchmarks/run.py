@@ -0,0 +1,395 @@
+"""
+Offline benchmark harness for the query and ingestion paths.
+
+Every external dependency is replaced by a local stand-in (see benchmarks/fakes.py):
+the upstream APIs and the LLM by a fake HTTP server, Weaviate by the memory-mapped
+store in a temporary directory, and the MiniLM models by hash embedders. Results
+are printed (or written with --output) as JSON so runs can be compared across commits:
+
+    python -m benchmarks.run --scenarios query,rest,websocket --concurrency 16 --requests 400 \\
+        --latency openai=300,binance=20 --token-ms 5 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.fakes import (SERVICES, FakeDocumentEmbedder, FakeEpochRedis, FakeTextEmbedder, FakeUpstreamServer,
+                              ServiceProfile)
+
+SCENARIOS = ("ingest", "docs", "query", "rest", "rest_stream", "websocket")
+ERROR_PREFIX = "Sorry, I encountered an error"
+QUESTION_TEMPLATES = ["What is the RSI for {}?", "Should I buy {} now?",
+                      "Current sentiment for {}", "Is {} overbought on the 4h chart?",
+                      "Summarise the MACD and Bollinger setup for {}"]
+
+
+def parse_service_values(text, cast=float):
+    values = {}
+    for item in filter(None, (text or "").split(",")):
+        name, value = item.split("=")
+        if name not in SERVICES:
+            raise SystemExit(f"Unknown service '{name}', expected one of {SERVICES}")
+        values[name] = cast(value)
+    return values
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def summarize(latencies, errors, elapsed, **extra):
+    latencies = np.asarray(latencies) * 1000
+    summary = {
+        "requests": int(len(latencies)),
+        "errors": int(errors),
+        "throughput_per_s": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+            "mean": round(float(latencies.mean()), 3),
+            "max": round(float(latencies.max()), 3),
+        } if len(latencies) else None,
+    }
+    summary.update(extra)
+    summary["peak_rss_mb"] = peak_rss_mb()
+    return summary
+
+
+def questions(n, coins=("BTC", "ETH", "SOL", "XRP", "BNB", "DOGE", "ADA", "TRX"), unique=True):
+    result = []
+    for i in range(n):
+        question = QUESTION_TEMPLATES[i % len(QUESTION_TEMPLATES)].format(
+            coins[(i // len(QUESTION_TEMPLATES)) % len(coins)])
+        # A request number makes every question distinct so the answer cache cannot hide the pipeline
+        result.append(f"{question} (#{i})" if unique else question)
+    return result
+
+
+def configure_environment(server, workdir, args):
+    os.environ.update({
+        "COINGECKO_URL": f"{server.url}/coingecko/api/v3/coins/markets",
+        "CMC_URL": f"{server.url}/cmc/v1/cryptocurrency/listings/latest",
+        "BINANCE_API": f"{server.url}/binance/api/v3/klines",
+        "SANTIMENT_URL": f"{server.url}/santiment/graphql",
+        "OPENAI_BASE_URL": f"{server.url}/openai/v1",
+        "OPENAI_API_KEY": "bench",
+        "OPENROUTER_BASE_URL": f"{server.url}/openrouter/api/v1",
+        "OPENROUTER_API_KEY": "bench",
+        "DOCUMENT_STORE_BACKEND": "mmap",
+        "MMAP_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "INGEST_MANIFEST_PATH": os.path.join(workdir, "ingest_manifest.sqlite3"),
+        # Nothing listens on port 1, so Redis calls fail fast. Rate limits, session memory and
+        # digests fall back to in-process or file state; the ingestion epoch comes from the
+        # FakeEpochRedis stand-in installed by install_fake_models()
+        "REDIS_URL": "redis://127.0.0.1:1/0",
+        "SENTRY_DSN": "",
+        # One process, no broker: fetch symbols in the task's own thread pool, unthrottled
+        "INGEST_FANOUT": "local",
+        **{f"RATE_LIMIT_{name.upper()}_PER_SEC": "1000000" for name in ("coingecko", "cmc", "binance", "santiment")},
+        "QUERY_MAX_CONCURRENCY": str(args.concurrency),
+        "QUERY_MAX_QUEUE": str(max(args.requests, 32)),
+    })
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_SIZE"] = "0"
+
+
+def install_fake_models(args):
+    import answer_cache
+    import data_loader
+    import rag_pipeline
+    # The answer cache is bypassed while the epoch is unknown, as it is without Redis
+    answer_cache._redis = FakeEpochRedis()
+    # Taken by init() instead of loading the sentence-transformers model
+    rag_pipeline.text_embedder = FakeTextEmbedder(latency_ms=args.embed_ms, per_text_ms=args.embed_text_ms)
+    data_loader.document_embedder = FakeDocumentEmbedder(latency_ms=args.embed_ms)
+
+
+def write_corpus(folder, n_files, words_per_file, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(["bitcoin", "ethereum", "liquidity", "momentum", "breakout", "support",
+                           "resistance", "volume", "funding", "halving", "staking", "macd",
+                           "rsi", "bollinger", "divergence", "trend", "risk", "position"])
+    os.makedirs(folder, exist_ok=True)
+    for i in range(n_files):
+        words = rng.choice(vocabulary, size=words_per_file)
+        extension = ".md" if i % 3 == 0 else ".txt"
+        with open(os.path.join(folder, f"doc_{i:05d}{extension}"), "w", encoding="utf-8") as f:
+            f.write(f"# Note {i}\n\n" if extension == ".md" else "")
+            f.write(" ".join(words))
+
+
+def run_ingest(args, server):
+    import tasks
+    tasks.INGEST_CONCURRENCY = args.concurrency
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        run_started = time.perf_counter()
+        try:
+            tasks.ingest_all_data.run()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - run_started)
+    elapsed = time.perf_counter() - started
+    summary = summarize(latencies, errors, elapsed, symbols=args.coins,
+                        symbols_per_s=round(args.coins * args.iterations / elapsed, 3))
+    summary["upstream_requests"] = dict(server.requests)
+    return summary
+
+
+def run_docs(args, workdir):
+    import data_loader
+    folder = os.path.join(workdir, "corpus")
+    write_corpus(folder, args.doc_files, args.doc_words)
+    runs = {}
+    for label in ("cold", "warm"):
+        started = time.perf_counter()
+        data_loader.ingest_local_docs(folder)
+        elapsed = time.perf_counter() - started
+        runs[label] = summarize([elapsed], 0, elapsed, files=args.doc_files,
+                                files_per_s=round(args.doc_files / elapsed, 3))
+    return runs
+
+
+def run_query(args):
+    import rag_pipeline
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(question):
+        started = time.perf_counter()
+        answer = rag_pipeline.query(question)
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            errors[0] += answer.startswith(ERROR_PREFIX)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one, questions(args.requests, unique=not args.answer_cache)))
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+async def asgi_post(app, path, payload, headers):
+    """
+    POST straight into an ASGI app and time the response body.
+
+    httpx's ASGITransport buffers the whole body, which would hide time to first token.
+
+    Returns:
+        tuple: (status, body bytes, seconds to first non-empty body chunk or None)
+    """
+    body = json.dumps(payload).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 0),
+             "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+             + [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+    started = time.perf_counter()
+    response = {"status": None, "body": b"", "first": None}
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if response["first"] is None:
+                response["first"] = time.perf_counter() - started
+            response["body"] += message["body"]
+
+    await app(scope, receive, send)
+    return response["status"], response["body"], response["first"]
+
+
+async def _rest(args, stream):
+    import rest_server
+    path = "/query/stream" if stream else "/query"
+    latencies, ttft = [], []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(question):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            status, body, first = await asgi_post(rest_server.app, path, {"question": question},
+                                                  {"X-API-KEY": rest_server.API_KEY})
+            latencies.append(time.perf_counter() - started)
+            if first is not None:
+                ttft.append(first)
+            errors += status != 200 or ERROR_PREFIX.encode() in body
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions(args.requests, unique=not args.answer_cache)))
+    elapsed = time.perf_counter() - started
+    extra = {}
+    if stream and ttft:
+        extra["ttft_ms"] = {"p50": round(float(np.percentile(ttft, 50)) * 1000, 3),
+                            "p95": round(float(np.percentile(ttft, 95)) * 1000, 3),
+                            "p99": round(float(np.percentile(ttft, 99)) * 1000, 3)}
+    return summarize(latencies, errors, elapsed, **extra)
+
+
+class FakeConnection:
+    """Minimal stand-in for a websockets server connection driving websocket_server.handler."""
+
+    class Request:
+        def __init__(self, headers):
+            self.headers = headers
+
+    def __init__(self, messages, api_key):
+        self.request = self.Request({"X-API-KEY": api_key})
+        self.messages = list(messages)
+        self.sent_at = None
+        self.latencies = []
+        self.replies = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # The handler answers a message completely before reading the next one
+        if not self.messages:
+            raise StopAsyncIteration
+        self.sent_at = time.perf_counter()
+        return self.messages.pop(0)
+
+    async def send(self, data):
+        if self.sent_at is None:
+            return  # greeting
+        self.latencies.append(time.perf_counter() - self.sent_at)
+        self.replies.append(data)
+
+
+async def _websocket(args):
+    import websocket_server
+    all_questions = questions(args.requests, unique=not args.answer_cache)
+    per_connection = [all_questions[i::args.concurrency] for i in range(args.concurrency)]
+    connections = [FakeConnection(messages, websocket_server.WS_API_KEY)
+                   for messages in per_connection if messages]
+    started = time.perf_counter()
+    await asyncio.gather(*(websocket_server.handler(c) for c in connections))
+    elapsed = time.perf_counter() - started
+    latencies = [latency for c in connections for latency in c.latencies]
+    errors = sum(reply.startswith((ERROR_PREFIX, "Server busy")) for c in connections for reply in c.replies)
+    return summarize(latencies, errors, elapsed, connections=len(connections))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks with local stand-ins for all external services.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100,
+                        help="queries per query/rest/rest_stream/websocket scenario")
+    parser.add_argument("--iterations", type=int, default=3, help="ingestion task runs")
+    parser.add_argument("--coins", type=int, default=50)
+    parser.add_argument("--doc-files", type=int, default=200)
+    parser.add_argument("--doc-words", type=int, default=1500)
+    parser.add_argument("--latency", default="openai=200,openrouter=250,binance=10,coingecko=10,santiment=20,cmc=10",
+                        help="per-service latency in ms, e.g. openai=300,binance=20")
+    parser.add_argument("--jitter", default="", help="per-service latency jitter in ms")
+    parser.add_argument("--errors", default="", help="per-service error rate, e.g. openai=0.01")
+    parser.add_argument("--slow-rate", default="", help="per-service chance of a slow request, e.g. openai=0.05")
+    parser.add_argument("--slow-ms", default="", help="per-service extra latency of a slow request in ms")
+    parser.add_argument("--santiment-partial-errors", type=float, default=0.0,
+                        help="chance that one slug/metric of a batched Santiment query errors")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="fake LLM delay per streamed token")
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="fake embedding cost per call/document")
+    parser.add_argument("--embed-text-ms", type=float, default=0.5,
+                        help="extra fake query-embedding cost per text in a batched call")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="repeat questions and keep the answer cache enabled")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    latency = parse_service_values(args.latency)
+    jitter = parse_service_values(args.jitter)
+    errors = parse_service_values(args.errors)
+    slow_rate = parse_service_values(args.slow_rate)
+    slow_ms = parse_service_values(args.slow_ms)
+    profiles = {name: ServiceProfile(latency_ms=latency.get(name, 0.0), jitter_ms=jitter.get(name, 0.0),
+                                     error_rate=errors.get(name, 0.0), slow_rate=slow_rate.get(name, 0.0),
+                                     slow_ms=slow_ms.get(name, 0.0), token_ms=args.token_ms,
+                                     completion_tokens=args.completion_tokens)
+                for name in SERVICES}
+    profiles["santiment"].partial_error_rate = args.santiment_partial_errors
+
+    report = {"commit": git_commit(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+              "python": sys.version.split()[0], "config": vars(args), "scenarios": {}}
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir, \
+            FakeUpstreamServer(profiles, n_coins=args.coins) as server:
+        configure_environment(server, workdir, args)
+        started = time.perf_counter()
+        install_fake_models(args)
+        report["import_seconds"] = round(time.perf_counter() - started, 3)
+        import rag_pipeline
+        started = time.perf_counter()
+        rag_pipeline.warm_up()
+        report["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+
+        # Query scenarios need a populated store
+        if any(s in scenarios for s in ("query", "rest", "rest_stream", "websocket")) \
+                and not {"ingest", "docs"} & set(scenarios):
+            scenarios = ["ingest", "docs"] + scenarios
+            args.iterations = 1
+        for scenario in scenarios:
+            if scenario == "ingest":
+                result = run_ingest(args, server)
+            elif scenario == "docs":
+                result = run_docs(args, workdir)
+            elif scenario == "query":
+                result = run_query(args)
+            elif scenario == "rest":
+                result = asyncio.run(_rest(args, stream=False))
+            elif scenario == "rest_stream":
+                result = asyncio.run(_rest(args, stream=True))
+            else:
+                result = asyncio.run(_websocket(args))
+            report["scenarios"][scenario] = result
+        # Hedged duplicates show up as extra requests, cancelled losers as cancelled streams
+        report["llm_requests"] = {name: server.requests[name] for name in ("openai", "openrouter")}
+        report["llm_cancelled"] = {name: server.cancelled[name] for name in ("openai", "openrouter")}
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import re
+from typing import List, Optional
+from haystack import Document, component
+from loguru import logger
+from prometheus_client import Counter, Histogram
+
+try:
+    import tiktoken
+except ImportError:  # optional, token counts fall back to a characters/4 estimate
+    tiktoken = None
+
+# Metrics
+context_tokens = Histogram("rag_context_tokens", "Estimated tokens of packed context per query",
+                           buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 4000, 8000))
+context_tokens_saved = Histogram("rag_context_tokens_saved",
+                                 "Estimated prompt tokens saved per query by context packing",
+                                 buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+context_documents_dropped = Counter("rag_context_documents_dropped_total",
+                                    "Retrieved documents left out of the prompt", ["reason"])
+
+_WORD = re.compile(r"\w+")
+_encoding = None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken's cl100k_base when available, else estimate 4 characters per token."""
+    global _encoding, tiktoken
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # The BPE file is downloaded on first use; without network keep estimating
+            logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+            tiktoken = None
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Prefix of `text` that count_tokens() puts within max_tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        text = _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        text = text[:max_tokens * 4]
+    # Re-encoding the cut can merge tokens differently; shave until the count fits
+    while text and count_tokens(text) > max_tokens:
+        text = text[:-max(1, len(text) // 50)]
+    return text
+
+
+def shingles(text, size=5):
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def render_market_document(doc):
+    """
+    Render a market snapshot (meta from tasks.build_coin_document) as one compact line.
+
+    Keeps the fields the prompt asks for (price, change, RSI, MACD histogram, SMA20,
+    Bollinger band) and drops the remaining EMA/MACD lines already implied by them.
+    """
+    meta = doc.meta
+    parts = []
+    for interval, s in meta["indicators"].items():
+        parts.append(f"{interval} close={s['close']} chg={s['change_pct']}% RSI={s['rsi_14']} "
+                     f"MACDh={s['macd_hist']} SMA20={s['sma_20']} BB={s['bb_lower']}-{s['bb_upper']}")
+    parts.extend(f"{key}={value}" for key, value in (meta.get("sentiment") or {}).items())
+    return f"[{meta.get('symbol')} market] " + "; ".join(parts)
+
+
+def render_document(doc):
+    if isinstance(doc.meta.get("indicators"), dict):
+        return render_market_document(doc)
+    source = doc.meta.get("filename")
+    return f"[{source}] {doc.content}" if source else doc.content
+
+
+@component
+class ContextPacker:
+    """
+    Turns retrieved documents into the prompt's context string within a token budget.
+
+    Documents are ranked by their (fused) retrieval score, near-duplicates are
+    dropped by word-shingle Jaccard similarity, market snapshots are rendered as
+    one-line summaries, and blocks are packed greedily until `token_budget` is
+    reached. The first block is truncated rather than dropped if it alone is too big.
+    `pinned_documents` (e.g. the current market snapshot of a coin named in the
+    question) always come first and are never deduplicated or dropped.
+    """
+
+    def __init__(self, token_budget: int = 1500, duplicate_threshold: float = 0.85,
+                 separator: str = "\n---\n"):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.separator = separator
+        self.separator_tokens = count_tokens(separator)
+
+    @component.output_types(context=str, documents=List[Document])
+    def run(self, documents: List[Document], token_budget: Optional[int] = None,
+            pinned_documents: Optional[List[Document]] = None):
+        budget = token_budget or self.token_budget
+        pinned = pinned_documents or []
+        pinned_ids = {doc.id for doc in pinned}
+        pinned_symbols = {doc.meta.get("symbol") for doc in pinned if "indicators" in doc.meta}
+        ranked = sorted(documents, key=lambda d: d.score if d.score is not None else 0.0, reverse=True)
+
+        kept, kept_shingles = list(pinned), [shingles(doc.content or "") for doc in pinned]
+        for doc in ranked:
+            if doc.content is None or doc.id in pinned_ids:
+                continue
+            if "indicators" in doc.meta and doc.meta.get("symbol") in pinned_symbols:
+                # Older snapshot of a coin whose latest snapshot is pinned
+                context_documents_dropped.labels(reason="superseded").inc()
+                continue
+            doc_shingles = shingles(doc.content)
+            if any(jaccard(doc_shingles, other) >= self.duplicate_threshold for other in kept_shingles):
+                context_documents_dropped.labels(reason="duplicate").inc()
+                continue
+            kept.append(doc)
+            kept_shingles.append(doc_shingles)
+
+        blocks, packed, used = [], [], 0
+        for doc in kept:
+            block = render_document(doc)
+            tokens = count_tokens(block) + (self.separator_tokens if blocks else 0)
+            if used + tokens > budget and doc.id not in pinned_ids:
+                if blocks:
+                    context_documents_dropped.labels(reason="budget").inc()
+                    continue
+                block = truncate_to_tokens(block, budget)
+                tokens = count_tokens(block)
+            blocks.append(block)
+            packed.append(doc)
+            used += tokens
+
+        context = self.separator.join(blocks)
+        # What PromptBuilder rendered before packing: the whole retrieved list
+        unpacked = count_tokens(str(documents)) if documents else 0
+        context_tokens.observe(used)
+        context_tokens_saved.observe(max(0, unpacked - used))
+        return {"context": context, "documents": packed}
@@ -1,71 +1,173 @@
 import uuid
 import os
-from haystack_integrations.document_stores.weaviate import WeaviateDocumentStore
-from haystack.components.preprocessors import DocumentSplitter
-from haystack import Document
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from haystack.components.embedders import SentenceTransformersDocumentEmbedder
+from haystack.document_stores.types import DuplicatePolicy
 from loguru import logger
 import sentry_sdk
+from answer_cache import bump_ingestion_epoch
+from document_stores import EMBEDDING_MODEL, create_document_store
+from document_extraction import iter_source_files, split_file
+from ingest_manifest import IngestManifest, content_hash, file_sha256
+from observability import init_sentry
 
 # Initialize Sentry for error tracking
-sentry_sdk.init(dsn=os.getenv("SENTRY_DSN", ""), traces_sample_rate=1.0)
+init_sentry()
 
-# Initialize WeaviateDocumentStore
-document_store = WeaviateDocumentStore(
-    url="http://localhost:8080",
-    timeout=(10, 60),
-    batch_size=1000
-)
+# Initialize document store (Weaviate or the local memory-mapped store)
+document_store = create_document_store()
 
-# Initialize DocumentSplitter
-preprocessor = DocumentSplitter(
-    split_by="word",
-    split_length=300,
-    split_overlap=30
-)
+# Extraction/splitting processes, and chunks written to the store per batch
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 256))
+INGEST_MANIFEST_PATH = os.getenv(
+    "INGEST_MANIFEST_PATH", "./data/ingest_manifest.sqlite3")
+
+# Chunk embedder, loaded on first use
+document_embedder = SentenceTransformersDocumentEmbedder(model=EMBEDDING_MODEL)
+
+
+def iter_file_chunks(file_paths, folder_path, workers=INGEST_WORKERS, correlation_id=""):
+    """
+    Yield (file_path, chunks) as the process pool finishes each file.
+
+    At most 2 * workers files are in flight, so memory does not grow with the corpus.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        files = iter(file_paths)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < 2 * workers:
+                file_path = next(files, None)
+                if file_path is None:
+                    exhausted = True
+                    break
+                pending[executor.submit(
+                    split_file, file_path, folder_path)] = file_path
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    logger.error(
+                        f"Failed to read file {file_path}: {e} [CID: {correlation_id}]")
+                    continue
+                yield file_path, chunks
+
+
+def iter_changed_files(folder_path, manifest, changes, seen):
+    """
+    Yield files that are new or whose content changed since the last ingestion.
+
+    Files with the same mtime and size as in the manifest are skipped without
+    being read; a changed mtime with an identical content hash only refreshes the
+    manifest. For yielded files, `changes` receives the stat/hash to record once
+    their chunks are written.
+    """
+    for file_path in iter_source_files(folder_path):
+        path = os.path.abspath(file_path)
+        seen.add(path)
+        stat = os.stat(path)
+        entry = manifest.get(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            continue
+        sha256 = file_sha256(path)
+        if entry and entry["sha256"] == sha256:
+            manifest.touch(path, stat.st_mtime_ns, stat.st_size)
+            continue
+        changes[path] = (stat.st_mtime_ns, stat.st_size, sha256,
+                         entry["chunk_ids"] if entry else [])
+        yield path
+
+
+def embed_chunks(chunks, manifest):
+    """Attach embeddings to chunks, embedding only texts not already in the manifest's cache."""
+    hashes = [content_hash(chunk.content, EMBEDDING_MODEL) for chunk in chunks]
+    cached = manifest.get_embeddings(set(hashes))
+    missing = [(chunk, key) for chunk, key in zip(chunks, hashes)
+               if key not in cached]
+    if missing:
+        document_embedder.warm_up()
+        embedded = document_embedder.run(
+            documents=[chunk for chunk, _ in missing])["documents"]
+        fresh = {key: doc.embedding for doc, (_, key) in zip(embedded, missing)}
+        manifest.put_embeddings(fresh)
+        cached.update(fresh)
+    for chunk, key in zip(chunks, hashes):
+        chunk.embedding = cached[key]
+    return len(chunks) - len(missing)
 
 
 def ingest_local_docs(folder_path="./docs"):
     """
-    Ingest documents from a local folder into WeaviateDocumentStore.
+    Ingest new and changed documents from a local folder (recursively) into the configured document store.
+
+    Unchanged files are skipped, edited files have their previous chunks replaced
+    and chunks of files deleted from the folder are removed from the store.
 
     Args:
-        folder_path (str): Path to the folder containing .txt or .pdf files.
+        folder_path (str): Path to the folder containing .txt, .md or .pdf files.
     """
     correlation_id = str(uuid.uuid4())
     logger.configure(extra={"correlation_id": correlation_id})
     try:
         logger.info(f"Starting document ingestion [CID: {correlation_id}]")
+        manifest = IngestManifest(INGEST_MANIFEST_PATH)
+        changes = {}
+        seen = set()
+        stats = {"files": 0, "written": 0, "deleted": 0, "cached": 0}
+        batch = []
+        batch_files = []
 
-        # Read files and create documents
-        documents = []
-        for filename in os.listdir(folder_path):
-            if filename.endswith((".txt", ".pdf")):
-                file_path = os.path.join(folder_path, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        documents.append(
-                            Document(content=content, meta={"filename": filename}))
-                except Exception as e:
-                    logger.error(
-                        f"Failed to read file {filename}: {e} [CID: {correlation_id}]")
-                    continue
+        def flush():
+            stats["cached"] += embed_chunks(batch, manifest)
+            new_ids = {chunk.id for chunk in batch}
+            stale = [doc_id for path, _ in batch_files for doc_id in changes[path][3]
+                     if doc_id not in new_ids]
+            if stale:
+                document_store.delete_documents(stale)
+                stats["deleted"] += len(stale)
+            if batch:
+                document_store.write_documents(
+                    batch, policy=DuplicatePolicy.OVERWRITE)
+                stats["written"] += len(batch)
+            for path, chunk_ids in batch_files:
+                mtime_ns, size, sha256, _ = changes.pop(path)
+                manifest.update(path, mtime_ns, size, sha256, chunk_ids)
+            batch.clear()
+            batch_files.clear()
 
-        if not documents:
-            logger.warning(
-                f"No valid documents found in {folder_path} [CID: {correlation_id}]")
-            return
+        changed_files = iter_changed_files(folder_path, manifest, changes, seen)
+        for path, chunks in iter_file_chunks(changed_files, folder_path, correlation_id=correlation_id):
+            stats["files"] += 1
+            batch.extend(chunks)
+            batch_files.append((path, [chunk.id for chunk in chunks]))
+            if len(batch) >= INGEST_BATCH_SIZE:
+                flush()
+        if batch_files:
+            flush()
 
-        # Preprocess documents
-        processed_docs = preprocessor.run(documents=documents)
-        logger.info(
-            f"Preprocessed {len(processed_docs['documents'])} documents [CID: {correlation_id}]")
+        for path in manifest.paths_under(folder_path) - seen:
+            entry = manifest.get(path)
+            if entry["chunk_ids"]:
+                document_store.delete_documents(entry["chunk_ids"])
+                stats["deleted"] += len(entry["chunk_ids"])
+            manifest.remove(path)
+
+        if not stats["written"] and not stats["deleted"]:
+            logger.info(
+                f"No new or changed documents in {folder_path} [CID: {correlation_id}]")
+            return
 
-        # Write to Weaviate
-        document_store.write_documents(
-            processed_docs["documents"], policy="SKIP")
+        bump_ingestion_epoch()
         logger.info(
-            f"Successfully ingested {len(processed_docs['documents'])} documents [CID: {correlation_id}]")
+            f"Ingested {stats['written']} chunks from {stats['files']} changed files "
+            f"({stats['cached']} embeddings from cache), removed {stats['deleted']} stale chunks "
+            f"[CID: {correlation_id}]")
     except Exception as e:
         logger.exception(f"Failed to ingest documents [CID: {correlation_id}]")
         sentry_sdk.capture_exception(e)
@@ -0,0 +1,77 @@
+import os
+import re
+from haystack import Document
+from haystack.components.preprocessors import DocumentSplitter
+from pypdf import PdfReader
+
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".markdown", ".pdf")
+
+def _unwrap_emphasis(match):
+    # Code spans match the first alternative and are left for the inline code rule
+    return match.group(2) if match.group(1) else match.group(0)
+
+
+_MARKDOWN_RULES = [
+    (re.compile(r"```[^\n]*\n"), ""),                       # code fence markers
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),         # images -> alt text
+    (re.compile(r"\[([^\]]*)\]\([^)]*\)"), r"\1"),          # links -> link text
+    (re.compile(r"<[^>]+>"), ""),                           # inline HTML
+    (re.compile(r"^\s{0,3}#{1,6}\s*", re.MULTILINE), ""),   # headings
+    (re.compile(r"^\s*>\s?", re.MULTILINE), ""),            # block quotes
+    (re.compile(r"^\s*([-*_]\s*){3,}$", re.MULTILINE), ""),  # horizontal rules
+    # Emphasis: paired delimiters only, so snake_case, 2*3 and text inside `code` survive
+    (re.compile(r"`[^`\n]*`|(\*\*|__)(.+?)\1"), _unwrap_emphasis),
+    (re.compile(r"`[^`\n]*`|(?<!\w)([*_])(\S.*?)\1(?!\w)"), _unwrap_emphasis),
+    (re.compile(r"`([^`\n]*)`"), r"\1"),                     # inline code
+]
+
+# Created lazily so every worker process builds its own splitter
+_splitter = None
+
+
+def iter_source_files(folder_path):
+    """Yield supported files under folder_path, recursing into sub-folders in a stable order."""
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(root, filename)
+
+
+def extract_text(file_path):
+    """
+    Extract plain text from a .txt, .md/.markdown or .pdf file.
+
+    PDF pages are joined with form feeds so DocumentSplitter can track page numbers.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".pdf":
+        reader = PdfReader(file_path)
+        return "\f".join(page.extract_text() or "" for page in reader.pages)
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if extension in (".md", ".markdown"):
+        for pattern, replacement in _MARKDOWN_RULES:
+            text = pattern.sub(replacement, text)
+    return text
+
+
+def split_file(file_path, folder_path):
+    """
+    Extract and chunk one file; runs inside the data_loader process pool.
+
+    Returns:
+        list: Chunk Documents carrying `filename` (relative to folder_path) in meta.
+    """
+    global _splitter
+    if _splitter is None:
+        _splitter = DocumentSplitter(
+            split_by="word",
+            split_length=300,
+            split_overlap=30
+        )
+    content = extract_text(file_path)
+    if not content.strip():
+        return []
+    filename = os.path.relpath(file_path, folder_path)
+    return _splitter.run(documents=[Document(content=content, meta={"filename": filename})])["documents"]
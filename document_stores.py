@@ -0,0 +1,38 @@
+import os
+from weaviate.classes.init import AdditionalConfig, Timeout
+from haystack_integrations.document_stores.weaviate import WeaviateDocumentStore
+from haystack_integrations.components.retrievers.weaviate import WeaviateBM25Retriever
+from haystack_integrations.components.retrievers.weaviate import WeaviateEmbeddingRetriever
+from mmap_document_store import MmapBM25Retriever, MmapDocumentStore, MmapEmbeddingRetriever
+
+# "weaviate" (default) or "mmap" for the in-process memory-mapped store
+DOCUMENT_STORE_BACKEND = os.getenv("DOCUMENT_STORE_BACKEND", "weaviate")
+WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
+MMAP_STORE_PATH = os.getenv("MMAP_STORE_PATH", "./data/vector_store")
+# "flat" (exact), "ivf" or "int8"
+MMAP_INDEX_MODE = os.getenv("MMAP_INDEX_MODE", "flat")
+# Model used for both chunk and query embeddings; they must match
+EMBEDDING_MODEL = os.getenv(
+    "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+def create_document_store(backend: str = DOCUMENT_STORE_BACKEND):
+    """Build the document store shared by ingestion (tasks, data_loader) and the RAG pipeline."""
+    if backend == "mmap":
+        return MmapDocumentStore(path=MMAP_STORE_PATH, index_mode=MMAP_INDEX_MODE)
+    if backend == "weaviate":
+        return WeaviateDocumentStore(
+            url=WEAVIATE_URL,
+            additional_config=AdditionalConfig(
+                timeout=Timeout(init=10, query=60, insert=120)),
+        )
+    raise ValueError(f"Unknown DOCUMENT_STORE_BACKEND '{backend}'")
+
+
+def create_retrievers(document_store):
+    """Return the (keyword, embedding) retriever pair matching the store's backend."""
+    if isinstance(document_store, MmapDocumentStore):
+        return (MmapBM25Retriever(document_store=document_store),
+                MmapEmbeddingRetriever(document_store=document_store))
+    return (WeaviateBM25Retriever(document_store=document_store),
+            WeaviateEmbeddingRetriever(document_store=document_store))
@@ -0,0 +1,41 @@
+import gc
+import os
+import shutil
+
+# REST API with several worker processes: gunicorn rest_server:app -c gunicorn.conf.py
+bind = f"0.0.0.0:{os.getenv('REST_PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = 120
+# Import the app and load the embedding model once in the master; workers fork from it
+preload_app = os.getenv("PRELOAD_MODEL", "true").lower() in ("1", "true", "yes")
+
+# Workers write their metrics to files here and /metrics aggregates them; this config is
+# read before the app is imported, so stale files from a previous run are cleared first
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked
+    if not preload_app:
+        return
+    import rag_pipeline
+    rag_pipeline.preload()
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers do not write to (and copy) the shared model pages
+    gc.freeze()
+    server.log.info("Embedding model preloaded for copy-on-write sharing")
+    if PROMETHEUS_MULTIPROC_DIR:
+        # The master serves no queries; drop its live gauges (e.g. rag_pipeline_ready = 0)
+        # so they do not skew the per-worker aggregates
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def child_exit(server, worker):
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+import numpy as np
+from haystack import component
+from haystack.dataclasses import StreamingChunk
+from loguru import logger
+from prometheus_client import Counter, Histogram
+
+# Metrics
+llm_request_latency = Histogram("rag_llm_request_seconds",
+                                "Duration of each LLM provider request by how it ended", ["provider", "outcome"])
+llm_first_token = Histogram("rag_llm_first_token_seconds",
+                            "Time to the first streamed token per LLM provider", ["provider"])
+llm_hedges = Counter("rag_llm_hedges_total",
+                     "Duplicate LLM requests sent because the first one was slow or failed", ["provider"])
+llm_degraded = Counter("rag_llm_degraded_total",
+                       "Answers cut short or replaced by retrieved context at the deadline", ["kind"])
+
+# Whole-answer budget per request, and when to hedge: this quantile of the primary's recent
+# time-to-first-token, or LLM_HEDGE_DELAY until LLM_HEDGE_MIN_SAMPLES requests have been seen
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", 20))
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", 2.0))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 32))
+
+DEGRADED_NOTICE = "The language model did not answer in time, so here is the most relevant data I found:"
+TRUNCATED_NOTICE = "(Answer cut short: the language model exceeded its time budget.)"
+
+_END = object()
+
+
+class DeadlineExceeded(TimeoutError):
+    """No provider started answering before the deadline."""
+
+
+@dataclass
+class LLMProvider:
+    """An OpenAI-compatible chat completions endpoint."""
+    name: str
+    base_url: str
+    model: str
+    api_key: str = ""
+
+
+def providers_from_env():
+    """
+    Providers in order of preference: OpenAI (OPENAI_API_KEY, LLM_MODEL) and OpenRouter
+    (OPENROUTER_API_KEY, OPENROUTER_MODEL). LLM_PRIMARY picks which one is asked first.
+    """
+    providers = []
+    if os.getenv("OPENAI_API_KEY"):
+        providers.append(LLMProvider(
+            "openai", os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            os.getenv("LLM_MODEL", "gpt-3.5-turbo"), os.getenv("OPENAI_API_KEY")))
+    if os.getenv("OPENROUTER_API_KEY"):
+        providers.append(LLMProvider(
+            "openrouter", os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+            os.getenv("OPENROUTER_MODEL", "openai/gpt-3.5-turbo"), os.getenv("OPENROUTER_API_KEY")))
+    primary = os.getenv("LLM_PRIMARY")
+    providers.sort(key=lambda p: p.name != primary)
+    if not providers:
+        raise ValueError("No LLM provider configured: set OPENAI_API_KEY or OPENROUTER_API_KEY")
+    return providers
+
+
+def _consume_exception(task):
+    # An attempt can fail while the race is being abandoned; mark its error as seen
+    if not task.cancelled():
+        task.exception()
+
+
+def degraded_answer(context):
+    return f"{DEGRADED_NOTICE}\n\n{context}" if context else f"{DEGRADED_NOTICE}\n\nNo relevant data was retrieved."
+
+
+def is_degraded(answer):
+    """True for answers produced after the deadline, which should not be cached."""
+    return answer.startswith(DEGRADED_NOTICE) or answer.endswith(TRUNCATED_NOTICE)
+
+
+@component
+class HedgedGenerator:
+    """
+    Chat completion with a deadline, request hedging and provider fallback.
+
+    The prompt goes to the first provider. If no token has arrived after the
+    primary's p95 time-to-first-token (or it fails), the same request goes to the
+    next provider, or again to the primary when only one is configured. Whichever
+    streams first wins and the other request is cancelled. If nothing has started
+    by `deadline`, the reply is the retrieved `context` instead; if the winner is
+    still streaming at the deadline, its partial answer is returned.
+
+    Requests run on one background event loop with a pooled HTTP client, so
+    cancelling the loser closes its connection immediately.
+    """
+
+    def __init__(self, providers: List[LLMProvider], generation_kwargs: Optional[Dict[str, Any]] = None,
+                 deadline: float = LLM_DEADLINE_SECONDS, hedge_quantile: float = LLM_HEDGE_QUANTILE,
+                 hedge_delay: float = LLM_HEDGE_DELAY, max_connections: int = LLM_MAX_CONNECTIONS):
+        if not providers:
+            raise ValueError("HedgedGenerator needs at least one provider")
+        self.providers = providers
+        self.generation_kwargs = generation_kwargs or {}
+        self.deadline = deadline
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
+        self.max_connections = max_connections
+        self.first_token_times = deque(maxlen=200)
+        self.lock = threading.Lock()
+        self.loop = None
+        self.client = None
+
+    def warm_up(self):
+        self._ensure_loop()
+
+    def _ensure_loop(self):
+        # Started on first use so each forked worker gets its own loop and connection pool
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-requests", daemon=True).start()
+                self.client = asyncio.run_coroutine_threadsafe(self._create_client(), loop).result()
+                self.loop = loop
+        return self.loop
+
+    async def _create_client(self):
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            # Past the deadline, so the deadline (not a read timeout) is what ends a slow attempt
+            timeout=httpx.Timeout(self.deadline + 5.0, connect=5.0))
+
+    def current_hedge_delay(self):
+        """Seconds to wait for the primary's first token before hedging."""
+        samples = list(self.first_token_times)
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return self.hedge_delay
+        return float(np.quantile(samples, self.hedge_quantile))
+
+    async def _attempt(self, provider, payload, label, claim, emit):
+        """
+        Stream one request. The first attempt to produce content claims the race and
+        forwards its tokens to emit(); any other attempt stops as soon as it has lost.
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self.client.stream(
+                    "POST", f"{provider.base_url.rstrip('/')}/chat/completions",
+                    json={**payload, "model": provider.model},
+                    headers={"Authorization": f"Bearer {provider.api_key}"}) as response:
+                response.raise_for_status()
+                won, meta = False, {"provider": provider.name, "model": provider.model, "usage": None,
+                                    "finish_reason": None}
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    meta["model"] = chunk.get("model") or meta["model"]
+                    meta["usage"] = chunk.get("usage") or meta["usage"]
+                    for choice in chunk.get("choices") or []:
+                        meta["finish_reason"] = choice.get("finish_reason") or meta["finish_reason"]
+                        content = (choice.get("delta") or {}).get("content")
+                        if not content:
+                            continue
+                        if not won:
+                            elapsed = time.perf_counter() - started
+                            llm_first_token.labels(provider=provider.name).observe(elapsed)
+                            if label == "primary":
+                                self.first_token_times.append(elapsed)
+                            if not claim(label):
+                                outcome = "lost"
+                                return None
+                            won = True
+                        emit(content)
+                if not won and not claim(label):
+                    outcome = "lost"
+                    return None
+                outcome = "won"
+                return meta
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            llm_request_latency.labels(provider=provider.name, outcome=outcome).observe(
+                time.perf_counter() - started)
+
+    async def _race(self, payload, emit):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        winner = loop.create_future()
+
+        def claim(label):
+            if winner.done():
+                return False
+            winner.set_result(label)
+            return True
+
+        primary, backup = self.providers[0], self.providers[1 % len(self.providers)]
+        providers = {"primary": primary, "hedge": backup}
+        tasks = {"primary": asyncio.create_task(self._attempt(primary, payload, "primary", claim, emit))}
+        tasks["primary"].add_done_callback(_consume_exception)
+        hedge_at = loop.time() + self.current_hedge_delay()
+        try:
+            while not winner.done():
+                now = loop.time()
+                if now >= deadline:
+                    raise DeadlineExceeded(f"No LLM response within {self.deadline}s")
+                pending = [task for task in tasks.values() if not task.done()]
+                if "hedge" not in tasks and (now >= hedge_at or not pending):
+                    if not pending:
+                        logger.warning(f"LLM provider {primary.name} failed, falling back to {backup.name}: "
+                                       f"{tasks['primary'].exception()}")
+                    llm_hedges.labels(provider=backup.name).inc()
+                    tasks["hedge"] = asyncio.create_task(self._attempt(backup, payload, "hedge", claim, emit))
+                    tasks["hedge"].add_done_callback(_consume_exception)
+                    continue
+                if not pending:
+                    # Both requests failed before producing anything
+                    raise tasks["hedge"].exception()
+                wake_at = deadline if "hedge" in tasks else min(deadline, hedge_at)
+                await asyncio.wait([winner, *pending], timeout=wake_at - now,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            label = winner.result()
+            for other, task in tasks.items():
+                if other != label:
+                    task.cancel()
+            try:
+                meta = await asyncio.wait_for(tasks[label], timeout=max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                meta = {"provider": providers[label].name, "model": providers[label].model,
+                        "usage": None, "finish_reason": "deadline", "truncated": True}
+            return {**meta, "hedged": "hedge" in tasks, "winner": label}
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    def run(self, prompt: str, context: Optional[str] = None,
+            streaming_callback: Optional[Callable[[StreamingChunk], None]] = None,
+            generation_kwargs: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            prompt: The user message.
+            context: Text to answer with if no provider responds before the deadline.
+            streaming_callback: Receives each StreamingChunk of the winning response.
+            generation_kwargs: Extra chat completion parameters, e.g. max_tokens.
+        """
+        payload = {**self.generation_kwargs, **(generation_kwargs or {}),
+                   "messages": [{"role": "user", "content": prompt}], "stream": True,
+                   "stream_options": {"include_usage": True}}
+        tokens = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._race(payload, tokens.put), self._ensure_loop())
+        future.add_done_callback(lambda _: tokens.put(_END))
+        parts = []
+        while True:
+            token = tokens.get()
+            if token is _END:
+                break
+            parts.append(token)
+            if streaming_callback is not None:
+                streaming_callback(StreamingChunk(content=token))
+        try:
+            meta = future.result()
+        except DeadlineExceeded as e:
+            logger.warning(f"{e}; answering with retrieved context")
+            llm_degraded.labels(kind="context").inc()
+            reply = degraded_answer(context)
+            if streaming_callback is not None:
+                streaming_callback(StreamingChunk(content=reply))
+            return {"replies": [reply], "meta": [{"degraded": True, "finish_reason": "deadline"}]}
+        reply = "".join(parts)
+        if meta.get("truncated"):
+            llm_degraded.labels(kind="truncated").inc()
+            suffix = f"\n\n{TRUNCATED_NOTICE}"
+            reply += suffix
+            if streaming_callback is not None:
+                streaming_callback(StreamingChunk(content=suffix))
+        return {"replies": [reply], "meta": [meta]}
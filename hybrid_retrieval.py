@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+from haystack import Document, component
+from prometheus_client import Histogram
+
+# Metrics
+retriever_latency = Histogram("rag_retriever_latency_seconds",
+                              "Latency of each retriever inside the hybrid retrieval stage", ["retriever"])
+
+JOIN_MODES = ("reciprocal_rank_fusion", "weighted")
+
+
+def reciprocal_rank_fusion(result_lists, weights=None, k=60):
+    """
+    Merge ranked document lists with (weighted) reciprocal-rank fusion, deduplicating by id.
+
+    Returns:
+        list: Documents ordered by fused score, each with `score` set to that score.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores = {}
+    documents = {}
+    for documents_list, weight in zip(result_lists, weights):
+        for rank, doc in enumerate(documents_list):
+            scores[doc.id] = scores.get(doc.id, 0.0) + weight / (k + rank + 1)
+            documents.setdefault(doc.id, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [replace(documents[doc_id], score=scores[doc_id]) for doc_id in ranked]
+
+
+def weighted_score_fusion(result_lists, weights=None):
+    """Merge lists by a weighted sum of min-max normalised retriever scores, deduplicating by id."""
+    weights = weights or [1.0] * len(result_lists)
+    scores = {}
+    documents = {}
+    for documents_list, weight in zip(result_lists, weights):
+        raw = [doc.score or 0.0 for doc in documents_list]
+        low, high = (min(raw), max(raw)) if raw else (0.0, 0.0)
+        for doc, score in zip(documents_list, raw):
+            normalised = (score - low) / (high - low) if high > low else 1.0
+            scores[doc.id] = scores.get(doc.id, 0.0) + weight * normalised
+            documents.setdefault(doc.id, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [replace(documents[doc_id], score=scores[doc_id]) for doc_id in ranked]
+
+
+@component
+class HybridRetriever:
+    """
+    Runs a keyword (BM25) and an embedding retriever concurrently and fuses their results.
+
+    The query embedding is computed on the embedding branch only, so BM25 search
+    overlaps with both the embedding forward pass and the vector search.
+    """
+
+    def __init__(self, bm25_retriever, embedding_retriever, text_embedder, top_k: int = 10,
+                 candidates: int = 10, join_mode: str = "reciprocal_rank_fusion",
+                 weights: Optional[List[float]] = None, rrf_k: int = 60):
+        if join_mode not in JOIN_MODES:
+            raise ValueError(
+                f"Unknown join_mode '{join_mode}', expected one of {JOIN_MODES}")
+        self.bm25_retriever = bm25_retriever
+        self.embedding_retriever = embedding_retriever
+        self.text_embedder = text_embedder
+        self.top_k = top_k
+        self.candidates = candidates
+        self.join_mode = join_mode
+        self.weights = weights or [1.0, 1.0]
+        self.rrf_k = rrf_k
+        self.executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="hybrid-retrieval")
+
+    def warm_up(self):
+        if hasattr(self.text_embedder, "warm_up"):
+            self.text_embedder.warm_up()
+
+    def _bm25(self, query, top_k, filters):
+        started = time.perf_counter()
+        documents = self.bm25_retriever.run(
+            query=query, top_k=top_k, filters=filters)["documents"]
+        retriever_latency.labels(retriever="bm25").observe(
+            time.perf_counter() - started)
+        return documents
+
+    def _embedding(self, query, top_k, filters):
+        started = time.perf_counter()
+        embedding = self.text_embedder.run(text=query)["embedding"]
+        documents = self.embedding_retriever.run(
+            query_embedding=embedding, top_k=top_k, filters=filters)["documents"]
+        retriever_latency.labels(retriever="embedding").observe(
+            time.perf_counter() - started)
+        return documents
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, top_k: Optional[int] = None, filters: Optional[Dict[str, Any]] = None):
+        top_k = top_k or self.top_k
+        candidates = max(self.candidates, top_k)
+        bm25 = self.executor.submit(self._bm25, query, candidates, filters)
+        embedding = self.executor.submit(
+            self._embedding, query, candidates, filters)
+        result_lists = [bm25.result(), embedding.result()]
+        if self.join_mode == "weighted":
+            fused = weighted_score_fusion(result_lists, self.weights)
+        else:
+            fused = reciprocal_rank_fusion(
+                result_lists, self.weights, self.rrf_k)
+        return {"documents": fused[:top_k]}
@@ -0,0 +1,221 @@
+import math
+import numpy as np
+
+# Binance kline row layout: [open_time, open, high, low, close, volume, close_time, ...]
+KLINE_COLUMNS = ("open_time", "open", "high", "low", "close", "volume")
+
+SMA_PERIOD = 20
+EMA_FAST = 12
+EMA_SLOW = 26
+MACD_SIGNAL = 9
+RSI_PERIOD = 14
+BB_PERIOD = 20
+BB_STDDEV = 2.0
+
+
+def parse_klines(klines):
+    """
+    Convert raw Binance klines (nested JSON lists of strings) into NumPy columns.
+
+    Returns:
+        dict: One float64 array per name in KLINE_COLUMNS, oldest candle first.
+    """
+    if not klines:
+        return {name: np.empty(0, dtype=np.float64) for name in KLINE_COLUMNS}
+    rows = np.asarray([row[:len(KLINE_COLUMNS)]
+                      for row in klines], dtype=np.float64)
+    return {name: rows[:, i] for i, name in enumerate(KLINE_COLUMNS)}
+
+
+def stack_series(series):
+    """Right-align 1-D series of unequal length into a NaN-padded 2-D matrix."""
+    width = max((len(s) for s in series), default=0)
+    matrix = np.full((len(series), width), np.nan, dtype=np.float64)
+    for i, s in enumerate(series):
+        if len(s):
+            matrix[i, width - len(s):] = s
+    return matrix
+
+
+def ema(values, period, alpha=None):
+    """Exponential moving average along axis 1, seeded from each row's first value."""
+    alpha = 2.0 / (period + 1) if alpha is None else alpha
+    out = np.empty_like(values)
+    prev = values[:, 0].copy()
+    out[:, 0] = prev
+    for t in range(1, values.shape[1]):
+        cur = values[:, t]
+        prev = np.where(np.isnan(prev), cur, prev + alpha * (cur - prev))
+        out[:, t] = prev
+    return out
+
+
+def rolling_window_stats(values, period):
+    """Mean and population std of the last `period` columns (NaN if not enough data)."""
+    window = values[:, -period:]
+    if window.shape[1] < period:
+        nan = np.full(values.shape[0], np.nan)
+        return nan, nan
+    return window.mean(axis=1), window.std(axis=1)
+
+
+def rsi_state(closes, period=RSI_PERIOD):
+    """Wilder-smoothed average gain/loss at the last candle of each row."""
+    deltas = np.diff(closes, axis=1)
+    if deltas.shape[1] == 0:
+        nan = np.full(closes.shape[0], np.nan)
+        return nan, nan
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+    padding = np.isnan(deltas)
+    gains[padding] = np.nan
+    losses[padding] = np.nan
+    alpha = 1.0 / period
+    return ema(gains, period, alpha)[:, -1], ema(losses, period, alpha)[:, -1]
+
+
+def rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        rsi = 100.0 - 100.0 / (1.0 + rs)
+    return np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), rsi)
+
+
+def compute_state(closes):
+    """
+    Recursive indicator state (EMAs, MACD signal, Wilder averages) at the last candle of each row.
+
+    The state can be advanced one candle at a time with advance_state() so that
+    incrementally synced buffers never need a full recomputation.
+    """
+    ema_fast = ema(closes, EMA_FAST)
+    ema_slow = ema(closes, EMA_SLOW)
+    macd_signal = ema(ema_fast - ema_slow, MACD_SIGNAL)
+    avg_gain, avg_loss = rsi_state(closes)
+    return {
+        "ema_fast": ema_fast[:, -1],
+        "ema_slow": ema_slow[:, -1],
+        "macd_signal": macd_signal[:, -1],
+        "avg_gain": avg_gain,
+        "avg_loss": avg_loss,
+        "last_close": closes[:, -1],
+    }
+
+
+def advance_state(state, close):
+    """Fold one new close into a state from compute_state(); returns a new state."""
+    fast = 2.0 / (EMA_FAST + 1)
+    slow = 2.0 / (EMA_SLOW + 1)
+    signal = 2.0 / (MACD_SIGNAL + 1)
+    wilder = 1.0 / RSI_PERIOD
+    delta = close - state["last_close"]
+    ema_fast = state["ema_fast"] + fast * (close - state["ema_fast"])
+    ema_slow = state["ema_slow"] + slow * (close - state["ema_slow"])
+    macd_line = ema_fast - ema_slow
+    return {
+        "ema_fast": ema_fast,
+        "ema_slow": ema_slow,
+        "macd_signal": state["macd_signal"] + signal * (macd_line - state["macd_signal"]),
+        "avg_gain": state["avg_gain"] + wilder * (np.maximum(delta, 0.0) - state["avg_gain"]),
+        "avg_loss": state["avg_loss"] + wilder * (np.maximum(-delta, 0.0) - state["avg_loss"]),
+        "last_close": close,
+    }
+
+
+def indicators_from_state(state, closes):
+    """Assemble the indicator summary from a recursive state and the trailing close window."""
+    macd_line = state["ema_fast"] - state["ema_slow"]
+    sma, _ = rolling_window_stats(closes, SMA_PERIOD)
+    bb_mid, bb_std = rolling_window_stats(closes, BB_PERIOD)
+    first = closes[np.arange(closes.shape[0]),
+                   np.argmax(~np.isnan(closes), axis=1)]
+    last = closes[:, -1]
+    previous = closes[:, -2] if closes.shape[1] > 1 else np.full(closes.shape[0], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = (last - first) / first * 100.0
+        candle_change_pct = (last - previous) / previous * 100.0
+    return {
+        "close": last,
+        "change_pct": change_pct,
+        "candle_change_pct": candle_change_pct,
+        "candles": np.count_nonzero(~np.isnan(closes), axis=1).astype(np.float64),
+        "sma_20": sma,
+        "ema_12": state["ema_fast"],
+        "ema_26": state["ema_slow"],
+        "macd": macd_line,
+        "macd_signal": state["macd_signal"],
+        "macd_hist": macd_line - state["macd_signal"],
+        "rsi_14": rsi_from_averages(state["avg_gain"], state["avg_loss"]),
+        "bb_upper": bb_mid + BB_STDDEV * bb_std,
+        "bb_middle": bb_mid,
+        "bb_lower": bb_mid - BB_STDDEV * bb_std,
+    }
+
+
+def compute_indicators(closes):
+    """
+    Compute the latest SMA, EMA, MACD, RSI and Bollinger values for every row at once.
+
+    Args:
+        closes (np.ndarray): 2-D matrix of close prices, one row per symbol.
+
+    Returns:
+        dict: Indicator name -> 1-D array with one value per row.
+    """
+    return indicators_from_state(compute_state(closes), closes)
+
+
+def compact_value(value):
+    """Round to 6 significant digits and map NaN/inf to None so values stay JSON-safe."""
+    value = float(value)
+    if not math.isfinite(value):
+        return None
+    return float(f"{value:.6g}")
+
+
+def summarize(values, row, volume):
+    """Extract one row of compute_indicators() output as a compact JSON-safe dict."""
+    summary = {name: compact_value(series[row])
+               for name, series in values.items()}
+    summary["volume"] = compact_value(volume)
+    return summary
+
+
+def compute_indicator_table(klines_by_symbol):
+    """
+    Run one batched indicator pass per interval across every symbol.
+
+    Args:
+        klines_by_symbol (dict): symbol -> {interval: raw Binance klines}.
+
+    Returns:
+        dict: symbol -> {interval: {indicator name: value}}.
+    """
+    by_interval = {}
+    for symbol, intervals in klines_by_symbol.items():
+        for interval, klines in intervals.items():
+            columns = parse_klines(klines)
+            if len(columns["close"]):
+                by_interval.setdefault(interval, []).append(
+                    (symbol, columns))
+
+    table = {symbol: {} for symbol in klines_by_symbol}
+    for interval, entries in by_interval.items():
+        closes = stack_series([columns["close"] for _, columns in entries])
+        values = compute_indicators(closes)
+        for row, (symbol, columns) in enumerate(entries):
+            table[symbol][interval] = summarize(
+                values, row, columns["volume"][-1])
+    return table
+
+
+def format_indicators(indicators):
+    """Render {interval: summary} as one compact line per interval for document content."""
+    lines = []
+    for interval, s in indicators.items():
+        lines.append(
+            f"{interval}: close={s['close']} chg={s['change_pct']}% RSI14={s['rsi_14']} "
+            f"MACD={s['macd']}/{s['macd_signal']} hist={s['macd_hist']} "
+            f"SMA20={s['sma_20']} EMA12={s['ema_12']} EMA26={s['ema_26']} "
+            f"BB20={s['bb_lower']}/{s['bb_middle']}/{s['bb_upper']}")
+    return "\n".join(lines)
@@ -0,0 +1,96 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(text, model):
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """
+    Persistent record of ingested files and cached chunk embeddings, backed by SQLite.
+
+    files:      absolute path -> (mtime_ns, size, sha256, ids of the chunks written for it)
+    embeddings: sha256(model, chunk text) -> float32 vector
+    """
+
+    def __init__(self, path: str = "./data/ingest_manifest.sqlite3"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS embeddings (
+                hash TEXT PRIMARY KEY,
+                vector BLOB NOT NULL
+            );
+        """)
+
+    def get(self, path):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT mtime_ns, size, sha256, chunk_ids FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        return {"mtime_ns": row[0], "size": row[1], "sha256": row[2], "chunk_ids": json.loads(row[3])}
+
+    def paths_under(self, folder):
+        prefix = os.path.join(os.path.abspath(folder), "")
+        with self.lock:
+            rows = self.db.execute("SELECT path FROM files").fetchall()
+        return {path for (path,) in rows if path.startswith(prefix)}
+
+    def update(self, path, mtime_ns, size, sha256, chunk_ids):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, sha256, chunk_ids) VALUES (?, ?, ?, ?, ?)",
+                (path, mtime_ns, size, sha256, json.dumps(chunk_ids)))
+
+    def touch(self, path, mtime_ns, size):
+        with self.lock, self.db:
+            self.db.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                            (mtime_ns, size, path))
+
+    def remove(self, path):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def get_embeddings(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        with self.lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE hash IN ({','.join('?' * len(part))})",
+                    part).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_embeddings(self, vectors):
+        with self.lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()])
@@ -0,0 +1,30 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared keep-alive connection pool for all upstream market-data APIs
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide requests.Session used by the ingest_sources fetchers.
+
+    The session keeps connections to CoinGecko, Binance, Santiment and CMC alive
+    between calls and is sized for the concurrent ingestion fan-out in tasks.py.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
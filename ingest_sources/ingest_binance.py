@@ -1,15 +1,21 @@
-import requests
+import os
 from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
+from ingest_sources.http_session import get_session
+from ingest_sources.rate_limit import token_bucket
 
-BINANCE_API = "https://api.binance.com/api/v3/klines"
+BINANCE_API = os.getenv("BINANCE_API", "https://api.binance.com/api/v3/klines")
+RATE_LIMIT = token_bucket("binance")
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def fetch_technical_data(symbol, interval="5m"):
+def fetch_technical_data(symbol, interval="5m", limit=100, start_time=None):
     try:
         symbol = f"{symbol}USDT"
-        params = {"symbol": symbol, "interval": interval, "limit": 100}
-        response = requests.get(BINANCE_API, params=params, timeout=10)
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = int(start_time)
+        RATE_LIMIT.acquire()
+        response = get_session().get(BINANCE_API, params=params, timeout=10)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -1,10 +1,13 @@
-import requests
 import os
 from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
+from ingest_sources.http_session import get_session
+from ingest_sources.rate_limit import token_bucket
 
 COINGECKO_API_KEY = os.getenv("CG_API_KEY")
-COINGECKO_URL = "https://api.coingecko.com/api/v3/coins/markets"
+COINGECKO_URL = os.getenv(
+    "COINGECKO_URL", "https://api.coingecko.com/api/v3/coins/markets")
+RATE_LIMIT = token_bucket("coingecko")
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
@@ -19,7 +22,8 @@ def fetch_top_50_symbols():
             "page": 1,
             "sparkline": False
         }
-        response = requests.get(
+        RATE_LIMIT.acquire()
+        response = get_session().get(
             COINGECKO_URL, headers=headers, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
@@ -29,7 +33,7 @@ def fetch_top_50_symbols():
                        # Common stablecoin symbols
                        "wrapped-eeth", "weth", "binance-bridged-usdt-bnb-smart-chain", "ethena-usde", "ethena-staked-usde", "blackrock-usd-institutional-digital-liquidity-fund", "jito-staked-sol", "susds", "usd1-wlfi", "lombard-staked-btc", "binance-peg-weth"]
         return [
-            {"symbol": coin["symbol"].upper(), "slug": coin["id"]}
+            {"symbol": coin["symbol"].upper(), "slug": coin["id"], "name": coin.get("name", "")}
             for coin in data
             if coin["symbol"].lower() not in stablecoins
             and "etf" not in coin.get("name", "").lower()
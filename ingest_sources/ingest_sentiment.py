@@ -17,47 +17,142 @@
 #         logger.warning(f"Sentiment fetch failed for {symbol}: {e}")
 #         raise
 
-import requests
 import os
 from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
+from ingest_sources.http_session import get_session
+from ingest_sources.rate_limit import token_bucket
 
 SANTIMENT_API_KEY = os.getenv("SANTIMENT_API_KEY")
-SANTIMENT_URL = "https://api.santiment.net/graphql"
+SANTIMENT_URL = os.getenv("SANTIMENT_URL", "https://api.santiment.net/graphql")
+RATE_LIMIT = token_bucket("santiment")
+# Santiment metrics fetched per slug; results are keyed without the "_total" suffix
+SENTIMENT_METRICS = [m.strip() for m in os.getenv(
+    "SENTIMENT_METRICS", "sentiment_balance_total,social_volume_total").split(",") if m.strip()]
+# Slugs per batched GraphQL request
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", 50))
+
+TIMESERIES_FIELDS = """timeseriesData(slug: $%s, from: $from, to: $to, interval: $interval) {
+      datetime
+      value
+    }"""
+
+
+def metric_key(metric):
+    return metric[:-len("_total")] if metric.endswith("_total") else metric
+
+
+def build_batch_query(slugs, metrics):
+    """
+    Build one GraphQL document fetching every metric for every slug through aliases.
+
+    Slugs and metric names are passed as variables, never formatted into the query.
+
+    Returns:
+        tuple: (query, variables, {alias: (slug, metric)})
+    """
+    declarations = ["$from: DateTime!", "$to: DateTime!", "$interval: interval"]
+    variables = {"from": "utc_now-1d", "to": "utc_now", "interval": "1d"}
+    selections = []
+    aliases = {}
+    for j, metric in enumerate(metrics):
+        declarations.append(f"$m{j}: String!")
+        variables[f"m{j}"] = metric
+    for i, slug in enumerate(slugs):
+        declarations.append(f"$s{i}: String!")
+        variables[f"s{i}"] = slug
+        for j, metric in enumerate(metrics):
+            alias = f"s{i}_m{j}"
+            aliases[alias] = (slug, metric)
+            selections.append(f"  {alias}: getMetric(metric: $m{j}) {{\n    {TIMESERIES_FIELDS % f's{i}'}\n  }}")
+    query = f"query Sentiment({', '.join(declarations)}) {{\n" + "\n".join(selections) + "\n}"
+    return query, variables, aliases
+
+
+def latest_value(result):
+    timeseries = (result or {}).get("timeseriesData") or []
+    return timeseries[-1]["value"] if timeseries else None
+
+
+def post_query(query, variables):
+    headers = {"Authorization": f"Apikey {SANTIMENT_API_KEY}"}
+    RATE_LIMIT.acquire()
+    response = get_session().post(
+        SANTIMENT_URL, headers=headers, json={"query": query, "variables": variables}, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def fetch_sentiment(slug):
+def fetch_sentiment(slug, metrics=None):
+    """
+    Fetch the latest daily value of each metric for one slug.
+
+    Returns:
+        dict: e.g. {"sentiment_balance": 1.2, "social_volume": 340}; a metric without data maps to None.
+    """
+    metrics = metrics or SENTIMENT_METRICS
     try:
-        headers = {"Authorization": f"Apikey {SANTIMENT_API_KEY}"}
-        query = """
-        query {
-          getMetric(metric: "sentiment_balance_total") {
-            timeseriesData(
-              slug: "%s"
-              from: "utc_now-1d"
-              to: "utc_now"
-              interval: "1d"
-            ) {
-              datetime
-              value
-            }
-          }
-        }
-        """ % slug
-        response = requests.post(SANTIMENT_URL, headers=headers, json={"query": query}, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if 'errors' in data:
+        query, variables, aliases = build_batch_query([slug], metrics)
+        data = post_query(query, variables)
+        if "errors" in data:
             logger.warning(f"Error fetching sentiment for {slug}: {data['errors']}")
-            return {"sentiment_balance": None}
-        timeseries = data.get('data', {}).get('getMetric', {}).get('timeseriesData', [])
-        if timeseries:
-            sentiment_score = timeseries[-1]['value']
-            logger.info(f"Fetched sentiment for {slug}: {sentiment_score}")
-            return {"sentiment_balance": sentiment_score}
-        else:
-            logger.warning(f"No sentiment data for {slug}")
-            return {"sentiment_balance": None}
+        results = data.get("data") or {}
+        sentiment = {metric_key(metric): latest_value(results.get(alias))
+                     for alias, (_, metric) in aliases.items()}
+        logger.info(f"Fetched sentiment for {slug}: {sentiment}")
+        return sentiment
     except Exception as e:
         logger.warning(f"Sentiment fetch failed for {slug}: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+def _fetch_sentiment_chunk(slugs, metrics):
+    query, variables, aliases = build_batch_query(slugs, metrics)
+    data = post_query(query, variables)
+    results = data.get("data") or {}
+    failed = set()
+    for error in data.get("errors") or []:
+        path = error.get("path") or []
+        if path and path[0] in aliases:
+            failed.add(aliases[path[0]][0])
+        else:
+            # An error not tied to one alias invalidates the whole response
+            raise RuntimeError(f"Santiment batch query failed: {error.get('message', error)}")
+    sentiments = {}
+    for alias, (slug, metric) in aliases.items():
+        if alias not in results:
+            failed.add(slug)
+        if slug not in failed:
+            sentiments.setdefault(slug, {})[metric_key(metric)] = latest_value(results.get(alias))
+    return {slug: value for slug, value in sentiments.items() if slug not in failed}, failed
+
+
+def fetch_sentiment_batch(slugs, metrics=None, batch_size=SENTIMENT_BATCH_SIZE):
+    """
+    Fetch sentiment for many slugs with one aliased GraphQL request per `batch_size` slugs.
+
+    Slugs whose part of the response errored are refetched one by one with
+    fetch_sentiment(); those still failing are left out of the result.
+
+    Returns:
+        dict: {slug: {"sentiment_balance": ..., "social_volume": ...}}
+    """
+    metrics = metrics or SENTIMENT_METRICS
+    slugs = list(dict.fromkeys(slugs))
+    sentiments = {}
+    for start in range(0, len(slugs), batch_size):
+        chunk = slugs[start:start + batch_size]
+        chunk_sentiments, failed = _fetch_sentiment_chunk(chunk, metrics)
+        sentiments.update(chunk_sentiments)
+        if failed:
+            logger.warning(f"Santiment batch had errors for {len(failed)} slugs, fetching them individually")
+        for slug in failed:
+            try:
+                sentiments[slug] = fetch_sentiment(slug, metrics)
+            except Exception:
+                pass
+    logger.info(f"Fetched sentiment for {len(sentiments)}/{len(slugs)} slugs in "
+                f"{-(-len(slugs) // batch_size)} batched requests")
+    return sentiments
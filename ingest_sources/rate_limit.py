@@ -0,0 +1,125 @@
+import os
+import time
+import threading
+import redis
+from loguru import logger
+from prometheus_client import Counter, Histogram
+
+# Metrics
+rate_limit_wait = Histogram("upstream_rate_limit_wait_seconds",
+                            "Time spent waiting for an upstream API rate-limit token", ["api"])
+rate_limit_rejected = Counter("upstream_rate_limit_rejected_total",
+                              "Upstream calls refused because the wait would exceed the limit", ["api"])
+
+REDIS_URL = os.getenv("REDIS_URL", os.getenv(
+    "CELERY_BROKER_URL", "redis://redis:6379/0"))
+# Longest a call waits for a token before failing (and being retried by its Celery task)
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 30))
+
+# Requests per second and burst size per upstream; each is shared by every worker through Redis
+DEFAULT_LIMITS = {
+    "coingecko": (0.5, 5),
+    "cmc": (0.5, 5),
+    "binance": (20, 40),
+    "santiment": (1, 5),
+}
+
+# Reserve one token and return how long the caller must wait for it, or -1 if longer than
+# max_wait. Tokens may go negative: later callers queue behind earlier reservations.
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens < 1 then
+  wait = (1 - tokens) / rate
+  if wait > max_wait then
+    return '-1'
+  end
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity / rate + max_wait) * 1000))
+return tostring(wait)
+"""
+
+_redis = redis.Redis.from_url(
+    REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when no token becomes available within RATE_LIMIT_MAX_WAIT."""
+
+
+class TokenBucket:
+    """
+    Token bucket for one upstream API.
+
+    State lives in Redis so the limit holds across all Celery workers; if Redis
+    is unreachable the bucket limits this process only.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.key = f"rate_limit:{name}"
+        self.script = _redis.register_script(_TAKE_SCRIPT)
+        self.lock = threading.Lock()
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _reserve_local(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            if wait > self.max_wait:
+                return -1.0
+            self.tokens -= 1
+            return wait
+
+    def _reserve(self):
+        try:
+            return float(self.script(keys=[self.key], args=[self.rate, self.capacity, self.max_wait]))
+        except redis.RedisError as e:
+            logger.debug(f"Rate limiter for {self.name} using local bucket: {e}")
+            return self._reserve_local()
+
+    def acquire(self):
+        """
+        Block until a request to this API is allowed.
+
+        Raises:
+            RateLimitExceeded: If the wait would exceed max_wait.
+        """
+        wait = self._reserve()
+        if wait < 0:
+            rate_limit_rejected.labels(api=self.name).inc()
+            raise RateLimitExceeded(f"{self.name} rate limit: no token within {self.max_wait}s")
+        rate_limit_wait.labels(api=self.name).observe(wait)
+        if wait > 0:
+            time.sleep(wait)
+
+
+def token_bucket(name):
+    """
+    Shared TokenBucket for an upstream, configured by RATE_LIMIT_<NAME>_PER_SEC and
+    RATE_LIMIT_<NAME>_BURST (defaults in DEFAULT_LIMITS).
+    """
+    with _buckets_lock:
+        if name not in _buckets:
+            rate, burst = DEFAULT_LIMITS.get(name, (1, 1))
+            rate = float(os.getenv(f"RATE_LIMIT_{name.upper()}_PER_SEC", rate))
+            burst = float(os.getenv(f"RATE_LIMIT_{name.upper()}_BURST", burst))
+            _buckets[name] = TokenBucket(name, rate, burst)
+        return _buckets[name]
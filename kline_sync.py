@@ -0,0 +1,187 @@
+import os
+import time
+import threading
+import numpy as np
+from loguru import logger
+from prometheus_client import Counter
+from ingest_sources.ingest_binance import fetch_technical_data
+from indicators import (KLINE_COLUMNS, advance_state, compute_state, indicators_from_state,
+                        parse_klines, summarize)
+
+# Metrics
+kline_requests = Counter("kline_sync_requests_total",
+                         "Binance kline requests made by the incremental sync", ["kind"])
+kline_candles = Counter("kline_sync_candles_total",
+                        "Closed candles appended to the kline ring buffers")
+
+# Candles kept per (symbol, interval); also the size of the initial full fetch
+KLINE_BUFFER_SIZE = int(os.getenv("KLINE_BUFFER_SIZE", 500))
+# Optional directory where ring buffers and indicator state survive worker restarts
+KLINE_CACHE_DIR = os.getenv("KLINE_CACHE_DIR", "")
+
+CLOSE_TIME = 6
+BINANCE_MAX_LIMIT = 1000
+
+
+class KlineRingBuffer:
+    """Fixed-capacity ring of closed candles stored as a (capacity, 6) float64 array."""
+
+    def __init__(self, capacity: int = KLINE_BUFFER_SIZE):
+        self.capacity = capacity
+        self.rows = np.zeros((capacity, len(KLINE_COLUMNS)), dtype=np.float64)
+        self.size = 0
+        self.head = 0
+
+    def append(self, rows: np.ndarray):
+        for row in rows[-self.capacity:]:
+            self.rows[self.head] = row
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def ordered(self) -> np.ndarray:
+        if self.size < self.capacity:
+            return self.rows[:self.size]
+        return np.roll(self.rows, -self.head, axis=0)
+
+    @property
+    def last_open_time(self):
+        if not self.size:
+            return None
+        return self.rows[(self.head - 1) % self.capacity, 0]
+
+
+class KlineSeries:
+    """Ring buffer plus the recursive indicator state for one (symbol, interval)."""
+
+    def __init__(self, capacity: int = KLINE_BUFFER_SIZE):
+        self.buffer = KlineRingBuffer(capacity)
+        self.state = None
+        self.lock = threading.Lock()
+
+    def reset(self, rows: np.ndarray):
+        self.buffer = KlineRingBuffer(self.buffer.capacity)
+        self.buffer.append(rows)
+        closes = self.buffer.ordered()[:, 4][np.newaxis, :]
+        self.state = compute_state(closes) if closes.shape[1] else None
+
+    def extend(self, rows: np.ndarray):
+        self.buffer.append(rows)
+        for close in rows[:, 4]:
+            self.state = advance_state(self.state, np.array([close]))
+
+    def summary(self, live_row=None):
+        """Indicator summary over the buffer, provisionally including the in-progress candle."""
+        rows = self.buffer.ordered()
+        state = self.state
+        if live_row is not None:
+            rows = np.vstack([rows, live_row])
+            state = advance_state(state, np.array([live_row[4]]))
+        closes = rows[-self.buffer.capacity:, 4][np.newaxis, :]
+        return summarize(indicators_from_state(state, closes), 0, rows[-1, 5])
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, rows=self.buffer.ordered(),
+                 **{f"state_{k}": v for k, v in self.state.items()})
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        with np.load(path) as data:
+            self.buffer.append(data["rows"])
+            self.state = {k[len("state_"):]: data[k]
+                          for k in data.files if k.startswith("state_")}
+
+
+class KlineSync:
+    """
+    Incremental Binance kline sync keyed by (symbol, interval).
+
+    The first sync of a series fetches a full KLINE_BUFFER_SIZE window and seeds the
+    indicator state; later syncs request only candles newer than the last closed one
+    via startTime and fold them into the state one candle at a time.
+    """
+
+    def __init__(self, capacity: int = KLINE_BUFFER_SIZE, cache_dir: str = KLINE_CACHE_DIR):
+        self.capacity = min(capacity, BINANCE_MAX_LIMIT)
+        self.cache_dir = cache_dir
+        self.series = {}
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, symbol, interval):
+        return os.path.join(self.cache_dir, f"{symbol}_{interval}.npz")
+
+    def _get_series(self, symbol, interval):
+        with self.lock:
+            series = self.series.get((symbol, interval))
+            if series is None:
+                series = KlineSeries(self.capacity)
+                path = self._cache_path(
+                    symbol, interval) if self.cache_dir else None
+                if path and os.path.exists(path):
+                    try:
+                        series.load(path)
+                    except Exception as e:
+                        logger.warning(
+                            f"Discarding unreadable kline cache {path}: {e}")
+                        series = KlineSeries(self.capacity)
+                self.series[(symbol, interval)] = series
+            return series
+
+    def sync(self, symbol, interval):
+        """
+        Bring one series up to date and return its compact indicator summary.
+
+        Returns:
+            dict | None: Same shape as indicators.compute_indicator_table() values.
+        """
+        series = self._get_series(symbol, interval)
+        with series.lock:
+            last_open_time = series.buffer.last_open_time
+            if last_open_time is None or series.state is None:
+                klines = fetch_technical_data(
+                    symbol, interval, limit=self.capacity)
+                kline_requests.labels(kind="full").inc()
+                closed, live = self._split_closed(klines)
+                series.reset(closed)
+            else:
+                klines = fetch_technical_data(
+                    symbol, interval, limit=self.capacity, start_time=last_open_time + 1)
+                kline_requests.labels(kind="incremental").inc()
+                if len(klines) >= self.capacity:
+                    # Gap is larger than the buffer: the page does not reach "now", start over
+                    klines = fetch_technical_data(
+                        symbol, interval, limit=self.capacity)
+                    kline_requests.labels(kind="full").inc()
+                    closed, live = self._split_closed(klines)
+                    series.reset(closed)
+                else:
+                    closed, live = self._split_closed(klines)
+                    if len(closed):
+                        series.extend(closed)
+            kline_candles.inc(len(closed))
+            if series.state is None:
+                return None
+            if self.cache_dir:
+                series.save(self._cache_path(symbol, interval))
+            return series.summary(live)
+
+    @staticmethod
+    def _split_closed(klines):
+        """Separate closed candles from the still-open last candle Binance returns."""
+        now_ms = time.time() * 1000
+        closed = [row for row in klines if float(row[CLOSE_TIME]) < now_ms]
+        live = [row for row in klines if float(row[CLOSE_TIME]) >= now_ms]
+        columns = parse_klines(closed)
+        rows = np.column_stack([columns[name] for name in KLINE_COLUMNS]) if closed \
+            else np.empty((0, len(KLINE_COLUMNS)))
+        live_row = None
+        if live:
+            live_columns = parse_klines(live[-1:])
+            live_row = np.array([live_columns[name][0]
+                                for name in KLINE_COLUMNS])
+        return rows, live_row
+
+
+kline_sync = KlineSync()
@@ -0,0 +1,265 @@
+import os
+import re
+import math
+import json
+import time
+import threading
+from datetime import datetime, timezone
+import redis
+from loguru import logger
+from prometheus_client import Counter
+from answer_cache import REDIS_URL, get_ingestion_epoch
+
+# Metrics
+digest_answers = Counter("rag_digest_answers_total",
+                         "Questions checked against the market digests", ["outcome"])
+
+MARKET_DIGEST_PATH = os.getenv("MARKET_DIGEST_PATH", "./data/market_digests.json")
+MARKET_DIGEST_KEY = "rag:market_digests"
+# Digests older than this are not used to answer; the question goes to the LLM instead
+DIGEST_MAX_AGE = float(os.getenv("DIGEST_MAX_AGE", 900))
+# Interval quoted when the question does not name one
+DIGEST_DEFAULT_INTERVAL = os.getenv("DIGEST_DEFAULT_INTERVAL", "1h")
+
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+
+# Question words that ask for a digest field
+INTENT_WORDS = {
+    "price": {"price", "prices", "cost", "worth", "quote", "trading"},
+    "change": {"change", "changed", "performance", "gain", "gains", "move", "moved"},
+    "rsi": {"rsi", "overbought", "oversold"},
+    "macd": {"macd"},
+    "trend": {"trend", "trending", "bullish", "bearish", "momentum"},
+    "bollinger": {"bollinger", "band", "bands", "bb"},
+    "volume": {"volume"},
+    "sentiment": {"sentiment", "social", "mood"},
+    "summary": {"indicators", "technicals", "technical", "stats", "snapshot", "overview", "digest"},
+}
+INTERVAL_WORDS = {"5m": "5m", "1h": "1h", "hourly": "1h", "4h": "4h", "1d": "1d", "daily": "1d",
+                  "today": "1d"}
+# Words that do not change what is being asked
+FILLER_WORDS = {
+    "a", "about", "an", "and", "are", "at", "chart", "check", "current", "currently", "do", "does",
+    "for", "get", "give", "how", "in", "is", "it", "its", "latest", "level", "levels", "like",
+    "look", "looks", "me", "much", "now", "of", "on", "please", "reading", "right", "s", "show",
+    "status", "tell", "the", "timeframe", "value", "what", "whats", "with",
+}
+KNOWN_WORDS = set().union(*INTENT_WORDS.values(), INTERVAL_WORDS, FILLER_WORDS)
+_WORD = re.compile(r"[a-z0-9]+")
+
+_redis = redis.Redis.from_url(
+    REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+
+
+def _flags(summary):
+    close, sma, hist = summary.get("close"), summary.get("sma_20"), summary.get("macd_hist")
+    trend = "mixed"
+    if None not in (close, sma, hist):
+        if close > sma and hist > 0:
+            trend = "up"
+        elif close < sma and hist < 0:
+            trend = "down"
+    rsi = summary.get("rsi_14")
+    rsi_state = None if rsi is None else (
+        "overbought" if rsi >= RSI_OVERBOUGHT else "oversold" if rsi <= RSI_OVERSOLD else "neutral")
+    upper, lower = summary.get("bb_upper"), summary.get("bb_lower")
+    band = None
+    if None not in (close, upper, lower):
+        band = "above upper band" if close > upper else "below lower band" if close < lower else "inside bands"
+    return {"trend": trend, "rsi_state": rsi_state, "band": band}
+
+
+def build_digest(meta, previous=None):
+    """
+    Structured digest of one market document's meta (tasks.build_coin_document).
+
+    Sentiment deltas are taken against `previous`, the coin's digest from the last run.
+    """
+    intervals = {}
+    for interval, summary in (meta.get("indicators") or {}).items():
+        intervals[interval] = {
+            **{key: summary.get(key) for key in ("close", "change_pct", "candle_change_pct", "candles",
+                                                  "rsi_14", "macd_hist", "sma_20", "bb_upper",
+                                                  "bb_lower", "volume")},
+            **_flags(summary),
+        }
+    sentiment = dict(meta.get("sentiment") or {})
+    before = (previous or {}).get("sentiment") or {}
+    delta = {key: round(value - before[key], 6) for key, value in sentiment.items()
+             if isinstance(value, (int, float)) and isinstance(before.get(key), (int, float))}
+    return {"symbol": meta["symbol"], "slug": meta.get("slug"), "updated_at": meta.get("updated_at"),
+            "intervals": intervals, "sentiment": sentiment, "sentiment_delta": delta}
+
+
+def load_digests():
+    """Published digests {symbol: digest} from Redis, falling back to MARKET_DIGEST_PATH."""
+    try:
+        stored = _redis.hgetall(MARKET_DIGEST_KEY)
+        if stored:
+            return {symbol.decode(): json.loads(value) for symbol, value in stored.items()}
+    except redis.RedisError:
+        pass
+    if os.path.exists(MARKET_DIGEST_PATH):
+        with open(MARKET_DIGEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def publish_digests(documents):
+    """
+    Build a digest per market document and replace the published table with them.
+
+    Call before bumping the ingestion epoch so query processes reload the new table with it.
+    """
+    previous = load_digests()
+    digests = {doc.meta["symbol"]: build_digest(doc.meta, previous.get(doc.meta["symbol"]))
+               for doc in documents}
+    try:
+        pipe = _redis.pipeline(transaction=True)
+        pipe.delete(MARKET_DIGEST_KEY)
+        if digests:
+            pipe.hset(MARKET_DIGEST_KEY, mapping={symbol: json.dumps(digest)
+                                                  for symbol, digest in digests.items()})
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish market digests to Redis: {e}")
+    directory = os.path.dirname(MARKET_DIGEST_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{MARKET_DIGEST_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(digests, f)
+    os.replace(tmp_path, MARKET_DIGEST_PATH)
+    return digests
+
+
+def _number(value, sign=False, decimals=None):
+    """Fixed-point with thousands separators; by default six significant digits, at least two decimals."""
+    if value is None:
+        return "n/a"
+    if decimals is None:
+        magnitude = math.floor(math.log10(abs(value))) if value else 0
+        decimals = max(2, 5 - magnitude)
+    return f"{value:{'+' if sign else ''},.{decimals}f}"
+
+
+def _change(summary, interval):
+    parts = []
+    if summary.get("candle_change_pct") is not None:
+        parts.append(f"{_number(summary['candle_change_pct'], sign=True, decimals=2)}% over the last "
+                     f"{interval} candle")
+    if summary.get("change_pct") is not None:
+        span = f"{int(summary['candles'])} x {interval} candles" if summary.get("candles") else "close window"
+        parts.append(f"{_number(summary['change_pct'], sign=True, decimals=2)}% over the last {span}")
+    return "change " + (", ".join(parts) or "n/a")
+
+
+def render_answer(digest, intents, interval=None):
+    """
+    Plain-text answer for the requested digest fields of one coin.
+
+    RSI and trend are listed for every interval unless the question named one.
+    """
+    intervals = digest["intervals"]
+    if interval in intervals:
+        intervals = {interval: intervals[interval]}
+    else:
+        interval = DIGEST_DEFAULT_INTERVAL if DIGEST_DEFAULT_INTERVAL in intervals else next(iter(intervals))
+    s = digest["intervals"][interval]
+    if "summary" in intents:
+        intents = {"price", "change", "rsi", "macd", "trend", "bollinger", "sentiment"}
+    parts = []
+    if "price" in intents:
+        parts.append(f"price {_number(s['close'])}")
+    if "change" in intents:
+        parts.append(_change(s, interval))
+    if "rsi" in intents:
+        parts.append("RSI(14) " + ", ".join(
+            f"{iv} {_number(v['rsi_14'], decimals=1)} ({v['rsi_state'] or 'n/a'})" for iv, v in intervals.items()))
+    if "macd" in intents:
+        parts.append(f"{interval} MACD histogram {_number(s['macd_hist'], sign=True)}")
+    if "trend" in intents:
+        parts.append("trend " + ", ".join(f"{iv} {v['trend']}" for iv, v in intervals.items()))
+    if "bollinger" in intents:
+        parts.append(f"{interval} Bollinger {_number(s['bb_lower'])}-{_number(s['bb_upper'])}, "
+                     f"price {s['band'] or 'n/a'}")
+    if "volume" in intents:
+        parts.append(f"{interval} volume {_number(s['volume'])}")
+    if "sentiment" in intents:
+        delta = digest.get("sentiment_delta") or {}
+        parts.append("sentiment " + (", ".join(
+            f"{key} {_number(value)}" + (f" ({_number(delta[key], sign=True)} since last update)"
+                                         if key in delta else "")
+            for key, value in digest["sentiment"].items()) or "n/a"))
+    as_of = datetime.fromtimestamp(digest["updated_at"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    return f"{digest['symbol']} as of {as_of}: " + "; ".join(parts) + "."
+
+
+class DigestRouter:
+    """
+    Answers formulaic factual questions ("RSI for SOL", "is BTC overbought") from the digests.
+
+    A question qualifies only if, once the coins it names are removed, every word
+    is a known field, interval or filler word; anything else (advice, reasoning,
+    comparisons, dates) returns None and goes to the LLM. The table is reloaded
+    whenever the ingestion epoch changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # No epoch read yet; get_ingestion_epoch() returns None while Redis is unreachable,
+        # in which case the table is loaded once and kept until the epoch is known again
+        self.epoch = -1
+        self.digests = {}
+
+    def _refresh(self):
+        epoch = get_ingestion_epoch()
+        if epoch == self.epoch:
+            return
+        with self.lock:
+            if epoch == self.epoch:
+                return
+            try:
+                self.digests = load_digests()
+            except Exception as e:
+                logger.warning(f"Could not load market digests: {e}")
+            self.epoch = epoch
+
+    @staticmethod
+    def parse(question, coins):
+        """
+        Returns:
+            tuple: (set of intents, interval or None), or None if the question is not formulaic.
+        """
+        coin_words = set()
+        for coin in coins:
+            coin_words.add(coin["symbol"].lower())
+            coin_words.update(_WORD.findall(coin["slug"].lower()))
+            coin_words.update(_WORD.findall((coin.get("name") or "").lower()))
+        words = [word for word in _WORD.findall(question.lower()) if word not in coin_words]
+        if any(word not in KNOWN_WORDS for word in words):
+            return None
+        intents = {intent for intent, vocabulary in INTENT_WORDS.items() if vocabulary.intersection(words)}
+        if not intents:
+            return None
+        interval = next((INTERVAL_WORDS[word] for word in words if word in INTERVAL_WORDS), None)
+        return intents, interval
+
+    def answer(self, question, coins):
+        """Digest answer for the coins named in the question, or None to use the LLM."""
+        if not coins:
+            return None
+        parsed = self.parse(question, coins)
+        if parsed is None:
+            digest_answers.labels(outcome="not_factual").inc()
+            return None
+        self._refresh()
+        digests = [self.digests.get(coin["symbol"]) for coin in coins]
+        if any(d is None or not d.get("intervals") or not d.get("updated_at")
+               or time.time() - d["updated_at"] > DIGEST_MAX_AGE for d in digests):
+            digest_answers.labels(outcome="stale").inc()
+            return None
+        intents, interval = parsed
+        digest_answers.labels(outcome="answered").inc()
+        return "\n".join(render_answer(digest, intents, interval) for digest in digests)
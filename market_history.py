@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import time
+import fcntl
+from datetime import datetime, timezone
+import numpy as np
+from loguru import logger
+from prometheus_client import Counter
+
+# Metrics
+history_rows = Counter("market_history_rows_total",
+                       "Market snapshots appended to the columnar history store")
+
+MARKET_HISTORY_PATH = os.getenv("MARKET_HISTORY_PATH", "./data/market_history")
+TIMESTAMP_COLUMN = "updated_at"
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def snapshot_row(meta):
+    """
+    Flatten a market document's meta into one history row.
+
+    Indicator fields become "<interval>.<field>" columns and sentiment values
+    "sentiment.<key>"; missing values are stored as NaN.
+    """
+    row = {}
+    for interval, summary in (meta.get("indicators") or {}).items():
+        for field, value in summary.items():
+            row[f"{interval}.{field}"] = value
+    for key, value in (meta.get("sentiment") or {}).items():
+        row[f"sentiment.{key}"] = value
+    return {column: np.nan if value is None else float(value) for column, value in row.items()}
+
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class MarketHistoryStore:
+    """
+    Append-only columnar store of market snapshots on local disk.
+
+    Partitions are directories `<symbol>/<YYYY-MM-DD>/` holding one raw float64 file
+    per column plus `updated_at.i64`, so a backtest reads whole columns through
+    memory maps without parsing anything. Columns that appear later are back-filled
+    with NaN. The timestamp column is written last and defines the row count, so a
+    crash mid-append leaves no partial row visible; the next append trims it.
+    """
+
+    def __init__(self, path: str = MARKET_HISTORY_PATH):
+        self.path = path
+
+    def _partition(self, symbol, day):
+        return os.path.join(self.path, _UNSAFE.sub("_", symbol), day)
+
+    @staticmethod
+    def _column_path(partition, column):
+        return os.path.join(partition, f"{_UNSAFE.sub('_', column)}.f64")
+
+    @staticmethod
+    def _row_count(partition):
+        try:
+            return os.path.getsize(os.path.join(partition, f"{TIMESTAMP_COLUMN}.i64")) // 8
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _read_columns(partition):
+        try:
+            with open(os.path.join(partition, "columns.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _append_partition(self, partition, rows):
+        os.makedirs(partition, exist_ok=True)
+        with open(os.path.join(partition, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            count = self._row_count(partition)
+            columns = self._read_columns(partition)
+            added = sorted({column for _, row in rows for column in row} - set(columns))
+            if added:
+                columns = columns + added
+                tmp_path = os.path.join(partition, "columns.json.tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(columns, f)
+                os.replace(tmp_path, os.path.join(partition, "columns.json"))
+            for column in columns:
+                values = np.array([row.get(column, np.nan) for _, row in rows], dtype=np.float64)
+                with open(self._column_path(partition, column), "ab") as f:
+                    # Drop rows of an interrupted append and back-fill new columns
+                    size = f.tell() // 8
+                    if size > count:
+                        f.truncate(count * 8)
+                    elif size < count:
+                        np.full(count - size, np.nan).tofile(f)
+                    values.tofile(f)
+            with open(os.path.join(partition, f"{TIMESTAMP_COLUMN}.i64"), "ab") as f:
+                f.truncate(count * 8)
+                np.array([ts for ts, _ in rows], dtype=np.int64).tofile(f)
+
+    def append(self, symbol, rows):
+        """
+        Append snapshots of one symbol.
+
+        Args:
+            symbol: Coin ticker.
+            rows: Iterable of (unix timestamp, {column: value}) pairs.
+        """
+        by_day = {}
+        for timestamp, row in rows:
+            by_day.setdefault(_day(timestamp), []).append((int(timestamp), row))
+        for day, day_rows in by_day.items():
+            self._append_partition(self._partition(symbol, day), day_rows)
+            history_rows.inc(len(day_rows))
+
+    def append_documents(self, documents):
+        """Append the indicator and sentiment values of market documents (tasks.build_coin_document)."""
+        by_symbol = {}
+        for doc in documents:
+            timestamp = doc.meta.get("updated_at") or int(time.time())
+            by_symbol.setdefault(doc.meta["symbol"], []).append((timestamp, snapshot_row(doc.meta)))
+        for symbol, rows in by_symbol.items():
+            self.append(symbol, rows)
+
+    def symbols(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path)
+                      if os.path.isdir(os.path.join(self.path, name)))
+
+    def columns(self, symbol):
+        """All columns recorded for a symbol, in first-seen order."""
+        seen = {}
+        for day in self._days(symbol):
+            for column in self._read_columns(self._partition(symbol, day)):
+                seen.setdefault(column)
+        return list(seen)
+
+    def _days(self, symbol, start=None, end=None):
+        directory = os.path.join(self.path, _UNSAFE.sub("_", symbol))
+        if not os.path.isdir(directory):
+            return []
+        first = _day(start) if start is not None else None
+        last = _day(end) if end is not None else None
+        return sorted(day for day in os.listdir(directory)
+                      if (first is None or day >= first) and (last is None or day <= last))
+
+    def load(self, symbol, start=None, end=None, columns=None):
+        """
+        Read a symbol's history between two unix timestamps (inclusive).
+
+        Args:
+            symbol: Coin ticker.
+            start: First timestamp to include, or None for the beginning.
+            end: Last timestamp to include, or None for the latest row.
+            columns: Columns to read, default all; unknown columns come back as NaN.
+
+        Returns:
+            dict: "updated_at" (int64 array) plus one float64 array per column, time-ordered.
+        """
+        columns = list(columns) if columns is not None else self.columns(symbol)
+        parts = {column: [] for column in [TIMESTAMP_COLUMN] + columns}
+        for day in self._days(symbol, start, end):
+            partition = self._partition(symbol, day)
+            count = self._row_count(partition)
+            if not count:
+                continue
+            timestamps = np.memmap(os.path.join(partition, f"{TIMESTAMP_COLUMN}.i64"),
+                                   dtype=np.int64, mode="r", shape=(count,))
+            keep = np.ones(count, dtype=bool)
+            if start is not None:
+                keep &= timestamps >= start
+            if end is not None:
+                keep &= timestamps <= end
+            parts[TIMESTAMP_COLUMN].append(np.asarray(timestamps[keep]))
+            for column in columns:
+                path = self._column_path(partition, column)
+                size = os.path.getsize(path) // 8 if os.path.exists(path) else 0
+                values = np.full(count, np.nan)
+                if size:
+                    values[:min(size, count)] = np.memmap(
+                        path, dtype=np.float64, mode="r", shape=(size,))[:count]
+                parts[column].append(values[keep])
+        result = {column: np.concatenate(chunks) if chunks
+                  else np.empty(0, dtype=np.int64 if column == TIMESTAMP_COLUMN else np.float64)
+                  for column, chunks in parts.items()}
+        order = np.argsort(result[TIMESTAMP_COLUMN], kind="stable")
+        return {column: values[order] for column, values in result.items()}
+
+
+market_history = MarketHistoryStore()
+
+
+def record_market_history(documents, correlation_id=""):
+    """Append snapshots to the history store; failures are logged, never fatal to ingestion."""
+    try:
+        market_history.append_documents(documents)
+    except Exception as e:
+        logger.warning(f"Could not append market history: {e} [CID: {correlation_id}]")
@@ -0,0 +1,410 @@
+import os
+import re
+import json
+import math
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import numpy as np
+from haystack import Document, component, default_from_dict, default_to_dict
+from haystack.document_stores.errors import DuplicateDocumentError
+from haystack.document_stores.types import DuplicatePolicy
+from haystack.utils.filters import document_matches_filter
+from loguru import logger
+
+INDEX_MODES = ("flat", "ivf", "int8")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class BM25Index:
+    """In-process Okapi BM25 inverted index over row numbers of the store."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def add(self, row: int, text: str):
+        tokens = tokenize(text)
+        self.lengths[row] = len(tokens)
+        self.total_length += len(tokens)
+        for token in tokens:
+            postings = self.postings.setdefault(token, {})
+            postings[row] = postings.get(row, 0) + 1
+
+    def remove(self, row: int, text: str):
+        self.total_length -= self.lengths.pop(row, 0)
+        for token in set(tokenize(text)):
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self.postings[token]
+
+    def scores(self, query: str, n_rows: int) -> np.ndarray:
+        scores = np.zeros(n_rows, dtype=np.float32)
+        if not self.lengths:
+            return scores
+        n_docs = len(self.lengths)
+        avg_length = self.total_length / n_docs
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) /
+                           (len(postings) + 0.5))
+            rows = np.fromiter(postings.keys(), dtype=np.int64)
+            tf = np.fromiter(postings.values(), dtype=np.float32)
+            lengths = np.fromiter((self.lengths[r] for r in postings), dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+class MmapDocumentStore:
+    """
+    Local document store: embeddings in a memory-mapped float32 matrix, everything else in a JSON sidecar.
+
+    Implements the Haystack DocumentStore protocol so it can stand in for
+    WeaviateDocumentStore. Embeddings are L2-normalised on write, so dot product
+    equals cosine similarity. Search is brute force by default; "ivf" probes the
+    nearest k-means cells and "int8" scans scalar-quantised codes before an exact
+    rerank. Several processes may share one directory: writers take a file lock
+    and readers reload when the sidecar changes.
+    """
+
+    def __init__(self, path: str = "./data/vector_store", index_mode: str = "flat",
+                 n_lists: int = 64, n_probe: int = 8):
+        if index_mode not in INDEX_MODES:
+            raise ValueError(
+                f"Unknown index_mode '{index_mode}', expected one of {INDEX_MODES}")
+        self.path = path
+        self.index_mode = index_mode
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.lock = threading.RLock()
+        self.meta_path = os.path.join(path, "documents.json")
+        self.matrix_path = os.path.join(path, "embeddings.f32")
+        os.makedirs(path, exist_ok=True)
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.dim = None
+        self.capacity = 0
+        self.embeddings = None
+        self.rows: List[Optional[Dict[str, Any]]] = []
+        self.row_of: Dict[str, int] = {}
+        self.free_rows: List[int] = []
+        # Rows deleted in the open write; reusable only once the sidecar no longer lists them
+        self.released_rows: List[int] = []
+        self.embedded = np.zeros(0, dtype=bool)
+        self.bm25 = BM25Index()
+        self.loaded_mtime = None
+        self._ann = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, path=self.path, index_mode=self.index_mode,
+                               n_lists=self.n_lists, n_probe=self.n_probe)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MmapDocumentStore":
+        return default_from_dict(cls, data)
+
+    # Persistence
+
+    def _sidecar_mtime(self):
+        try:
+            return os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        mtime = self._sidecar_mtime()
+        self._reset()
+        if mtime is None:
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self.dim = sidecar["dim"]
+        self.capacity = sidecar["capacity"]
+        self.rows = sidecar["rows"]
+        if self.dim and self.capacity:
+            self.embeddings = np.memmap(self.matrix_path, dtype=np.float32, mode="r+",
+                                        shape=(self.capacity, self.dim))
+        self.embedded = np.zeros(len(self.rows), dtype=bool)
+        for row, entry in enumerate(self.rows):
+            if entry is None:
+                self.free_rows.append(row)
+                continue
+            self.row_of[entry["id"]] = row
+            self.embedded[row] = entry["embedded"]
+            self.bm25.add(row, entry["content"])
+        self.loaded_mtime = mtime
+
+    def _refresh(self):
+        if self._sidecar_mtime() != self.loaded_mtime:
+            self._load()
+
+    def _persist(self):
+        if self.embeddings is not None:
+            self.embeddings.flush()
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity,
+                      "rows": self.rows}, f)
+        os.replace(tmp_path, self.meta_path)
+        self.loaded_mtime = self._sidecar_mtime()
+        self.free_rows.extend(self.released_rows)
+        self.released_rows = []
+        self._ann = None
+
+    @contextmanager
+    def _writing(self):
+        with self.lock, open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                try:
+                    yield
+                except Exception:
+                    # Drop partial in-memory changes; disk still holds the last good state, as
+                    # writes only touch matrix rows the sidecar does not reference
+                    self._load()
+                    raise
+                self._persist()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_capacity(self, n_rows: int):
+        if n_rows <= self.capacity:
+            return
+        capacity = max(1024, self.capacity)
+        while capacity < n_rows:
+            capacity *= 2
+        if self.embeddings is not None:
+            self.embeddings.flush()
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self.embeddings = np.memmap(self.matrix_path, dtype=np.float32, mode="r+",
+                                    shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    # DocumentStore protocol
+
+    def count_documents(self) -> int:
+        with self.lock:
+            self._refresh()
+            return len(self.row_of)
+
+    def filter_documents(self, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        with self.lock:
+            self._refresh()
+            documents = [self._document(row) for row in self.row_of.values()]
+        if filters:
+            documents = [
+                doc for doc in documents if document_matches_filter(filters, doc)]
+        return documents
+
+    def write_documents(self, documents: List[Document], policy: DuplicatePolicy = DuplicatePolicy.NONE) -> int:
+        if isinstance(policy, str):
+            policy = DuplicatePolicy(policy.lower())
+        written = 0
+        with self._writing():
+            for doc in documents:
+                existing = self.row_of.get(doc.id)
+                if existing is not None:
+                    if policy == DuplicatePolicy.SKIP:
+                        continue
+                    if policy == DuplicatePolicy.FAIL:
+                        raise DuplicateDocumentError(
+                            f"ID '{doc.id}' already exists in the document store.")
+                    # Into a fresh row: the old one stays intact for readers and rollback
+                    self._delete_row(existing)
+                    self._insert(doc)
+                else:
+                    self._insert(doc)
+                written += 1
+        return written
+
+    def delete_documents(self, document_ids: List[str]) -> None:
+        with self._writing():
+            for doc_id in document_ids:
+                row = self.row_of.get(doc_id)
+                if row is not None:
+                    self._delete_row(row)
+
+    def _insert(self, doc: Document):
+        row = self.free_rows.pop() if self.free_rows else len(self.rows)
+        embedded = doc.embedding is not None
+        if embedded:
+            vector = np.asarray(doc.embedding, dtype=np.float32)
+            if self.dim is None:
+                self.dim = int(vector.shape[0])
+            elif vector.shape[0] != self.dim:
+                raise ValueError(
+                    f"Embedding of document {doc.id} has dimension {vector.shape[0]}, expected {self.dim}")
+        if self.dim is not None:
+            # Rows without an embedding keep a zero vector so row numbers stay aligned
+            self._ensure_capacity(max(row + 1, len(self.rows)))
+            norm = np.linalg.norm(vector) if embedded else 0.0
+            self.embeddings[row] = vector / norm if norm else 0.0
+        entry = {"id": doc.id, "content": doc.content, "meta": doc.meta,
+                 "embedded": embedded}
+        if row == len(self.rows):
+            self.rows.append(entry)
+            self.embedded = np.append(self.embedded, embedded)
+        else:
+            self.rows[row] = entry
+            self.embedded[row] = embedded
+        self.row_of[doc.id] = row
+        self.bm25.add(row, doc.content)
+
+    def _delete_row(self, row: int):
+        entry = self.rows[row]
+        self.bm25.remove(row, entry["content"])
+        del self.row_of[entry["id"]]
+        self.rows[row] = None
+        self.embedded[row] = False
+        self.released_rows.append(row)
+
+    def _document(self, row: int, score: Optional[float] = None, with_embedding: bool = False) -> Document:
+        entry = self.rows[row]
+        embedding = None
+        if with_embedding and entry["embedded"]:
+            embedding = self.embeddings[row].tolist()
+        return Document(id=entry["id"], content=entry["content"], meta=entry["meta"],
+                        score=score, embedding=embedding)
+
+    # Retrieval
+
+    def _candidate_mask(self, filters, require_embedding):
+        mask = self.embedded.copy() if require_embedding else np.array(
+            [entry is not None for entry in self.rows], dtype=bool)
+        if filters:
+            for row in np.flatnonzero(mask):
+                if not document_matches_filter(filters, self._document(row)):
+                    mask[row] = False
+        return mask
+
+    def _top_k(self, scores, mask, top_k, with_embedding=False):
+        # Rows an approximate search did not probe already score -inf
+        mask = mask & np.isfinite(scores)
+        scores = np.where(mask, scores, -np.inf)
+        k = min(top_k, int(mask.sum()))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [self._document(int(row), float(scores[row]), with_embedding) for row in best]
+
+    def bm25_retrieval(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                       top_k: int = 10) -> List[Document]:
+        with self.lock:
+            self._refresh()
+            scores = self.bm25.scores(query, len(self.rows))
+            mask = self._candidate_mask(filters, require_embedding=False) & (scores > 0)
+            return self._top_k(scores, mask, top_k)
+
+    def embedding_retrieval(self, query_embedding: List[float], filters: Optional[Dict[str, Any]] = None,
+                            top_k: int = 10, return_embedding: bool = False) -> List[Document]:
+        with self.lock:
+            self._refresh()
+            n_rows = len(self.rows)
+            if self.embeddings is None or not n_rows:
+                return []
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            query = query / norm if norm else query
+            mask = self._candidate_mask(filters, require_embedding=True)
+            matrix = self.embeddings[:n_rows]
+            if self.index_mode == "flat":
+                scores = matrix @ query
+            else:
+                scores = self._approximate_scores(query, mask, top_k)
+            return self._top_k(scores, mask, top_k, return_embedding)
+
+    def _approximate_scores(self, query, mask, top_k):
+        n_rows = len(self.rows)
+        matrix = self.embeddings[:n_rows]
+        if self._ann is None:
+            self._ann = self._build_ann(matrix)
+        scores = np.full(n_rows, -np.inf, dtype=np.float32)
+        if self.index_mode == "ivf":
+            centroids, assignment = self._ann
+            probe = np.argsort(-(centroids @ query))[:self.n_probe]
+            rows = np.flatnonzero(np.isin(assignment, probe) & mask)
+            scores[rows] = matrix[rows] @ query
+            return scores
+        codes, scale = self._ann
+        approx = (codes.astype(np.float32) * scale) @ query
+        approx = np.where(mask, approx, -np.inf)
+        # Exact rerank of a few times top_k candidates from the int8 scan
+        shortlist = np.argpartition(-approx, min(4 * top_k, n_rows - 1))[:4 * top_k]
+        scores[shortlist] = matrix[shortlist] @ query
+        return scores
+
+    def _build_ann(self, matrix):
+        valid = np.flatnonzero(self.embedded)
+        if self.index_mode == "int8":
+            scale = np.maximum(np.abs(matrix[valid]).max(axis=0), 1e-6) / 127.0 \
+                if len(valid) else np.ones(self.dim, dtype=np.float32)
+            codes = np.clip(np.round(matrix / scale), -127, 127).astype(np.int8)
+            return codes, scale.astype(np.float32)
+        n_lists = max(1, min(self.n_lists, len(valid)))
+        rng = np.random.default_rng(0)
+        centroids = np.array(matrix[rng.choice(valid, size=n_lists, replace=False)]) \
+            if len(valid) else np.zeros((1, self.dim), dtype=np.float32)
+        for _ in range(10):
+            assignment = np.argmax(matrix[valid] @ centroids.T, axis=1)
+            for cell in range(len(centroids)):
+                members = valid[assignment == cell]
+                if len(members):
+                    centroid = matrix[members].mean(axis=0)
+                    centroids[cell] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        logger.info(f"Built IVF index with {len(centroids)} lists over {len(valid)} vectors")
+        return centroids, assignment
+
+
+@component
+class MmapBM25Retriever:
+    """Keyword retriever for MmapDocumentStore, run-compatible with WeaviateBM25Retriever."""
+
+    def __init__(self, document_store: MmapDocumentStore, filters: Optional[Dict[str, Any]] = None,
+                 top_k: int = 10):
+        self.document_store = document_store
+        self.filters = filters
+        self.top_k = top_k
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, filters: Optional[Dict[str, Any]] = None, top_k: Optional[int] = None):
+        documents = self.document_store.bm25_retrieval(
+            query, filters or self.filters, top_k or self.top_k)
+        return {"documents": documents}
+
+
+@component
+class MmapEmbeddingRetriever:
+    """Vector retriever for MmapDocumentStore, run-compatible with WeaviateEmbeddingRetriever."""
+
+    def __init__(self, document_store: MmapDocumentStore, filters: Optional[Dict[str, Any]] = None,
+                 top_k: int = 10):
+        self.document_store = document_store
+        self.filters = filters
+        self.top_k = top_k
+
+    @component.output_types(documents=List[Document])
+    def run(self, query_embedding: List[float], filters: Optional[Dict[str, Any]] = None,
+            top_k: Optional[int] = None):
+        documents = self.document_store.embedding_retrieval(
+            query_embedding, filters or self.filters, top_k or self.top_k)
+        return {"documents": documents}
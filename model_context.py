@@ -1,26 +1,193 @@
+import os
 import json
-from typing import List, Dict
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List
+import redis
+from loguru import logger
+from prometheus_client import Counter, Gauge
+from answer_cache import REDIS_URL
+
+# Metrics
+active_sessions = Gauge("rag_sessions_active", "Conversation sessions held in this process",
+                        multiprocess_mode="livesum")
+evicted_sessions = Counter("rag_sessions_evicted_total", "Sessions evicted from memory", ["reason"])
+
+# "memory" keeps sessions per process; "redis" shares them across processes and restarts
+SESSION_MEMORY_BACKEND = os.getenv("SESSION_MEMORY_BACKEND", "memory")
+SESSION_MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", 5))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 10000))
+SESSION_TTL = float(os.getenv("SESSION_TTL", 3600))
+# Longer questions/answers are truncated before being remembered
+SESSION_MAX_TURN_CHARS = int(os.getenv("SESSION_MAX_TURN_CHARS", 2000))
+
+
+def render_turn(user_input: str, bot_response: str) -> str:
+    return f"User: {user_input}\nBot: {bot_response}"
+
 
 class ConversationMemory:
-    def __init__(self, max_history: int = 5):
+    """
+    Last `max_history` exchanges of one conversation.
+
+    The rendered context string is kept up to date on every update instead of
+    being rebuilt from the whole history on each get_context() call.
+    """
+
+    def __init__(self, max_history: int = SESSION_MAX_HISTORY, max_turn_chars: int = SESSION_MAX_TURN_CHARS):
         self.max_history = max_history
-        self.history: List[Dict[str, str]] = []
+        self.max_turn_chars = max_turn_chars
+        self.history: deque = deque(maxlen=max_history)
+        self._context = ""
 
     def update(self, user_input: str, bot_response: str):
-        self.history.append({"user": user_input, "bot": bot_response})
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
+        turn = {"user": user_input[:self.max_turn_chars], "bot": bot_response[:self.max_turn_chars]}
+        if len(self.history) == self.max_history:
+            oldest = self.history[0]
+            # Drop the oldest turn and its separating newline from the front of the string
+            self._context = self._context[len(render_turn(oldest["user"], oldest["bot"])) + 1:]
+        self.history.append(turn)
+        rendered = render_turn(turn["user"], turn["bot"])
+        self._context = f"{self._context}\n{rendered}" if self._context else rendered
 
     def get_context(self) -> str:
-        return "\n".join([f"User: {h['user']}\nBot: {h['bot']}" for h in self.history])
+        return self._context
+
+    def set_history(self, history: List[Dict[str, str]]):
+        self.history.clear()
+        self._context = ""
+        for turn in history[-self.max_history:]:
+            self.update(turn["user"], turn["bot"])
 
     def save(self, file_path: str = "conversation.json"):
         with open(file_path, "w") as f:
-            json.dump(self.history, f)
+            json.dump(list(self.history), f)
 
     def load(self, file_path: str = "conversation.json"):
         try:
             with open(file_path, "r") as f:
-                self.history = json.load(f)[:self.max_history]
+                self.set_history(json.load(f))
         except FileNotFoundError:
-            self.history = []
\ No newline at end of file
+            self.set_history([])
+
+
+class SessionMemoryStore:
+    """
+    Per-process conversation memories keyed by session id.
+
+    Holds at most `max_sessions` conversations; the least recently used one is
+    evicted beyond that, and sessions idle for longer than `ttl` seconds expire.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, ttl: float = SESSION_TTL,
+                 max_history: int = SESSION_MAX_HISTORY):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history = max_history
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, session_id, create):
+        now = time.monotonic()
+        entry = self.sessions.get(session_id)
+        if entry is not None and entry[1] < now:
+            del self.sessions[session_id]
+            evicted_sessions.labels(reason="ttl").inc()
+            entry = None
+        if entry is None:
+            if not create:
+                return None
+            entry = [ConversationMemory(self.max_history), 0.0]
+            self.sessions[session_id] = entry
+        entry[1] = now + self.ttl
+        self.sessions.move_to_end(session_id)
+        self._evict(now)
+        return entry[0]
+
+    def _evict(self, now):
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            evicted_sessions.labels(reason="lru").inc()
+        # Expired sessions gather at the LRU end; drop a few per call to keep this O(1) amortised
+        for _ in range(2):
+            if not self.sessions:
+                break
+            session_id, entry = next(iter(self.sessions.items()))
+            if entry[1] >= now:
+                break
+            del self.sessions[session_id]
+            evicted_sessions.labels(reason="ttl").inc()
+        active_sessions.set(len(self.sessions))
+
+    def get_context(self, session_id: str) -> str:
+        with self.lock:
+            memory = self._get(session_id, create=False)
+            return memory.get_context() if memory is not None else ""
+
+    def update(self, session_id: str, user_input: str, bot_response: str):
+        with self.lock:
+            self._get(session_id, create=True).update(user_input, bot_response)
+
+    def clear(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            active_sessions.set(len(self.sessions))
+
+
+class RedisSessionMemoryStore:
+    """
+    Conversation memories in Redis, shared by every worker process and kept across restarts.
+
+    Each session is a capped list of JSON turns under `rag:session:<id>` that expires
+    after `ttl` seconds without activity. If Redis is unreachable the store falls
+    back to a per-process SessionMemoryStore.
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = SESSION_TTL,
+                 max_history: int = SESSION_MAX_HISTORY, max_turn_chars: int = SESSION_MAX_TURN_CHARS):
+        self.redis = redis.Redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        self.ttl = int(ttl)
+        self.max_history = max_history
+        self.max_turn_chars = max_turn_chars
+        self.fallback = SessionMemoryStore(ttl=ttl, max_history=max_history)
+
+    @staticmethod
+    def _key(session_id):
+        return f"rag:session:{session_id}"
+
+    def get_context(self, session_id: str) -> str:
+        try:
+            turns = self.redis.lrange(self._key(session_id), 0, -1)
+        except redis.RedisError as e:
+            logger.warning(f"Session memory unavailable in Redis, using local memory: {e}")
+            return self.fallback.get_context(session_id)
+        return "\n".join(render_turn(turn["user"], turn["bot"]) for turn in map(json.loads, turns))
+
+    def update(self, session_id: str, user_input: str, bot_response: str):
+        turn = json.dumps({"user": user_input[:self.max_turn_chars], "bot": bot_response[:self.max_turn_chars]})
+        key = self._key(session_id)
+        try:
+            with self.redis.pipeline() as pipe:
+                pipe.rpush(key, turn)
+                pipe.ltrim(key, -self.max_history, -1)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not store session turn in Redis, using local memory: {e}")
+            self.fallback.update(session_id, user_input, bot_response)
+
+    def clear(self, session_id: str):
+        try:
+            self.redis.delete(self._key(session_id))
+        except redis.RedisError:
+            pass
+        self.fallback.clear(session_id)
+
+
+def create_session_store(backend: str = SESSION_MEMORY_BACKEND):
+    if backend == "redis":
+        return RedisSessionMemoryStore()
+    if backend == "memory":
+        return SessionMemoryStore()
+    raise ValueError(f"Unknown SESSION_MEMORY_BACKEND '{backend}', expected 'memory' or 'redis'")
@@ -0,0 +1,121 @@
+import os
+import time
+import contextlib
+import contextvars
+from typing import Any, Dict, Iterator, Optional
+import sentry_sdk
+from haystack import tracing
+from haystack.tracing import Span, Tracer
+from prometheus_client import Counter, Histogram
+
+# Metrics
+component_latency = Histogram("rag_component_latency_seconds",
+                              "Latency of each Haystack component run inside a pipeline",
+                              ["component", "type"])
+llm_tokens = Counter("rag_llm_tokens_total", "Tokens reported by the LLM provider",
+                     ["kind"])
+retrieved_documents = Histogram("rag_retrieved_documents", "Documents handed to the prompt per query",
+                                buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+context_size = Histogram("rag_context_size_chars", "Characters of the rendered prompt sent to the LLM",
+                         buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000))
+
+# Fraction of transactions traced and profiled by Sentry; errors are always reported
+SENTRY_TRACES_SAMPLE_RATE = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", 0.05))
+SENTRY_PROFILES_SAMPLE_RATE = float(os.getenv("SENTRY_PROFILES_SAMPLE_RATE", 0.0))
+
+_current_span = contextvars.ContextVar("rag_current_span", default=None)
+
+
+def init_sentry():
+    """Initialize Sentry error tracking with sample rates taken from the environment."""
+    sentry_sdk.init(
+        dsn=os.getenv("SENTRY_DSN", ""),
+        traces_sample_rate=SENTRY_TRACES_SAMPLE_RATE,
+        profiles_sample_rate=SENTRY_PROFILES_SAMPLE_RATE,
+    )
+
+
+class MetricsSpan(Span):
+    def __init__(self, tags=None, inner=None):
+        self.tags = dict(tags or {})
+        self.inner = inner
+
+    def set_tag(self, key: str, value: Any) -> None:
+        self.tags[key] = value
+        if self.inner is not None:
+            self.inner.set_tag(key, value)
+
+    def set_content_tag(self, key: str, value: Any) -> None:
+        if self.inner is not None:
+            self.inner.set_content_tag(key, value)
+
+    def raw_span(self) -> Any:
+        return self.inner.raw_span() if self.inner is not None else self
+
+
+class MetricsTracer(Tracer):
+    """
+    Haystack tracer that times every component run into rag_component_latency_seconds.
+
+    Component runs also open a Sentry span, so sampled transactions show the
+    per-stage breakdown. Spans are forwarded to `inner` (e.g. an auto-configured
+    OpenTelemetry tracer) when one is given.
+    """
+
+    def __init__(self, inner: Optional[Tracer] = None):
+        self.inner = inner
+
+    @contextlib.contextmanager
+    def trace(self, operation_name: str, tags: Optional[Dict[str, Any]] = None,
+              parent_span: Optional[Span] = None) -> Iterator[Span]:
+        with contextlib.ExitStack() as stack:
+            inner = None
+            if self.inner is not None:
+                inner_parent = parent_span.inner if isinstance(parent_span, MetricsSpan) else parent_span
+                inner = stack.enter_context(self.inner.trace(operation_name, tags=tags, parent_span=inner_parent))
+            span = MetricsSpan(tags, inner)
+            token = _current_span.set(span)
+            if operation_name != "haystack.component.run":
+                try:
+                    yield span
+                finally:
+                    _current_span.reset(token)
+                return
+            name = span.tags.get("haystack.component.name", "unknown")
+            component_type = span.tags.get("haystack.component.type", "unknown")
+            stack.enter_context(sentry_sdk.start_span(op="haystack.component", name=name))
+            started = time.perf_counter()
+            try:
+                yield span
+            finally:
+                component_latency.labels(component=name, type=component_type).observe(
+                    time.perf_counter() - started)
+                _current_span.reset(token)
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+
+def enable_pipeline_metrics():
+    """Install MetricsTracer as Haystack's tracer, keeping any tracer that is already active."""
+    if isinstance(tracing.tracer.actual_tracer, MetricsTracer):
+        return
+    inner = tracing.tracer.actual_tracer if tracing.is_tracing_enabled() else None
+    tracing.enable_tracing(MetricsTracer(inner))
+
+
+def record_generation(meta):
+    """Count prompt/completion tokens from the generator's reply metadata."""
+    for reply_meta in meta or []:
+        usage = reply_meta.get("usage") or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                llm_tokens.labels(kind=kind.split("_")[0]).inc(usage[kind])
+
+
+def record_context(documents, prompt):
+    """Record how many documents and characters of context went into the prompt."""
+    if documents is not None:
+        retrieved_documents.observe(len(documents))
+    if prompt is not None:
+        context_size.observe(len(prompt))
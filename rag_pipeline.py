@@ -1,34 +1,69 @@
+import time
+_import_started = time.perf_counter()
 import os
 import uuid
-from haystack_integrations.document_stores.weaviate import WeaviateDocumentStore
-from haystack_integrations.components.retrievers.weaviate import WeaviateBM25Retriever
-from haystack_integrations.components.retrievers.weaviate import WeaviateEmbeddingRetriever
-from haystack.components.generators import OpenAIGenerator
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from haystack.components.builders import PromptBuilder
+from haystack.components.embedders import SentenceTransformersTextEmbedder
 from haystack import Pipeline
+from haystack.dataclasses import StreamingChunk
 from loguru import logger
 import sentry_sdk
-from prometheus_client import Counter, Histogram
-
-# Initialize Sentry for error tracking
-sentry_sdk.init(dsn=os.getenv("SENTRY_DSN", ""), traces_sample_rate=1.0)
+from prometheus_client import Counter, Gauge, Histogram
+from answer_cache import (ANSWER_CACHE_SIMILARITY, AnswerCache, cache_hits, cache_misses,
+                          get_ingestion_epoch, normalize_question, unit_vector)
+from hybrid_retrieval import HybridRetriever
+from context_packing import ContextPacker
+from batch_embedding import MicroBatchEmbedder
+from hedged_generation import HedgedGenerator, is_degraded, providers_from_env
+from model_context import create_session_store
+from symbol_index import SymbolRouter
+from market_digest import DigestRouter
+from single_flight import SingleFlight
+from document_stores import EMBEDDING_MODEL, create_document_store, create_retrievers
+from observability import enable_pipeline_metrics, init_sentry, record_context, record_generation
 
 # Metrics
 query_count = Counter("rag_query_total", "Total number of queries processed")
 query_latency = Histogram("rag_query_latency_seconds", "Query processing latency")
+time_to_first_token = Histogram("rag_time_to_first_token_seconds",
+                                "Time from query start to the first streamed answer token")
+query_inflight = Gauge("rag_query_inflight",
+                       "Async queries running or waiting for a query worker", multiprocess_mode="livesum")
+query_rejected = Counter("rag_query_rejected_total",
+                         "Async queries rejected because the query queue was full")
+query_coalesced = Counter("rag_query_coalesced_total",
+                          "Queries answered by joining an identical in-flight pipeline run")
+startup_seconds = Gauge("rag_startup_seconds",
+                        "Seconds this process spent in each startup stage", ["stage"],
+                        multiprocess_mode="max")
+pipeline_ready = Gauge("rag_pipeline_ready",
+                       "1 once the pipeline is built and warmed up in this process",
+                       multiprocess_mode="livemin")
 
-# Initialize WeaviateDocumentStore
-document_store = WeaviateDocumentStore(
-    url="http://localhost:8080"
-    timeout=(10, 60)
-)
-
-# Initialize retrievers
-bm25_retriever = WeaviateBM25Retriever(document_store=document_store)
-embedding_retriever = WeaviateEmbeddingRetriever(
-    document_store=document_store,
-    model="sentence-transformers/all-MiniLM-L6-v2"
-)
+# Pipeline runs executed in parallel by aquery(), and how many more may wait for a slot
+QUERY_MAX_CONCURRENCY = int(os.getenv("QUERY_MAX_CONCURRENCY", 8))
+QUERY_MAX_QUEUE = int(os.getenv("QUERY_MAX_QUEUE", 32))
+# Documents handed to the prompt after fusion, and candidates fetched from each retriever
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 10))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 20))
+# "reciprocal_rank_fusion" or "weighted"; weights are "bm25,embedding"
+HYBRID_JOIN_MODE = os.getenv("HYBRID_JOIN_MODE", "reciprocal_rank_fusion")
+HYBRID_WEIGHTS = [float(w) for w in os.getenv(
+    "HYBRID_WEIGHTS", "1.0,1.0").split(",")]
+# Token budget for the packed {{ context }}, and shingle similarity treated as a duplicate
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", 0.85))
+# Seconds between background warm-up attempts while the document store is unreachable
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", 5))
+# Concurrent query embeddings are batched: at most EMBED_BATCH_SIZE texts collected for up to
+# EMBED_BATCH_WAIT_MS; the last EMBED_CACHE_SIZE query vectors are reused
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", 5))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 1024))
 
 trader_prompt = """
 You are a professional cryptocurrency trader with a strong track record of profitable trades.
@@ -37,48 +72,454 @@ Use the context below to craft an expert response to the user's question.
 
 Context:
 {{ context }}
-
+{% if history %}
+Conversation so far:
+{{ history }}
+{% endif %}
 Question: {{ question }}
 
 Expert Trader's Answer:
 """
 
-prompt_builder = PromptBuilder(template=trader_prompt)
+answer_cache = AnswerCache()
+session_memory = create_session_store()
+# Identical questions asked while one is already running share its pipeline run
+inflight_queries = SingleFlight()
+# Formulaic factual questions are answered from the per-symbol market digests
+digest_router = DigestRouter()
+
+# Built by init() on first use rather than at import, so importing this module
+# neither connects to the document store nor loads the embedding model
+document_store = None
+text_embedder = None
+query_embedder = None
+hybrid_retriever = None
+rag_pipeline = None
+# Coins named in a question narrow retrieval and pin their latest market snapshot
+symbol_router = None
+_init_lock = threading.RLock()
+_instrumented = False
+_ready = False
+
+
+def load_embedder():
+    """Create the query embedder and load its model, once per process."""
+    global text_embedder
+    with _init_lock:
+        if text_embedder is None:
+            started = time.perf_counter()
+            embedder = SentenceTransformersTextEmbedder(model=EMBEDDING_MODEL)
+            embedder.warm_up()
+            text_embedder = embedder
+            startup_seconds.labels(stage="model").set(time.perf_counter() - started)
+    return text_embedder
+
+
+def preload():
+    """
+    Load the embedding model in a parent process before it forks workers.
+
+    Meant for gunicorn's preload_app: the model's memory is then shared
+    copy-on-write by every worker. Opens no connections and runs no inference,
+    both of which must happen after the fork (see warm_up()).
+    """
+    load_embedder()
+
+
+def build_pipeline(store, embedder):
+    bm25_retriever, embedding_retriever = create_retrievers(store)
+    hybrid_retriever = HybridRetriever(
+        bm25_retriever=bm25_retriever,
+        embedding_retriever=embedding_retriever,
+        text_embedder=embedder,
+        top_k=RETRIEVAL_TOP_K,
+        candidates=RETRIEVAL_CANDIDATES,
+        join_mode=HYBRID_JOIN_MODE,
+        weights=HYBRID_WEIGHTS,
+    )
+
+    context_packer = ContextPacker(
+        token_budget=CONTEXT_TOKEN_BUDGET,
+        duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD,
+    )
+
+    prompt_builder = PromptBuilder(template=trader_prompt)
+
+    # Deadline-bounded and hedged across OpenAI / OpenRouter (see hedged_generation.py)
+    prompt_node = HedgedGenerator(
+        providers=providers_from_env(),
+        generation_kwargs={"max_tokens": 500}
+    )
+
+    pipeline = Pipeline()
+    pipeline.add_component("retriever", hybrid_retriever)
+    pipeline.add_component("context_packer", context_packer)
+    pipeline.add_component("prompt_builder", prompt_builder)
+    pipeline.add_component("llm", prompt_node)
+
+    pipeline.connect("retriever.documents", "context_packer.documents")
+    pipeline.connect("context_packer.context", "prompt_builder.context")
+    pipeline.connect("prompt_builder.prompt", "llm.prompt")
+    # Answered with directly if the LLM misses its deadline
+    pipeline.connect("context_packer.context", "llm.context")
+    return pipeline, hybrid_retriever
+
+
+def init():
+    """
+    Connect to the document store and build the pipeline, once per process.
+
+    Raises:
+        Exception: If the document store is unreachable; the next call tries again.
+    """
+    global _instrumented, document_store, query_embedder, hybrid_retriever, rag_pipeline, symbol_router
+    if rag_pipeline is not None:
+        return rag_pipeline
+    with _init_lock:
+        if rag_pipeline is not None:
+            return rag_pipeline
+        started = time.perf_counter()
+        if not _instrumented:
+            # Sentry for error tracking, and per-component latency metrics
+            init_sentry()
+            enable_pipeline_metrics()
+            _instrumented = True
+        store = create_document_store()
+        embedder = MicroBatchEmbedder(load_embedder(), max_batch_size=EMBED_BATCH_SIZE,
+                                      max_wait_ms=EMBED_BATCH_WAIT_MS, cache_size=EMBED_CACHE_SIZE)
+        pipeline, retriever = build_pipeline(store, embedder)
+        document_store, query_embedder, hybrid_retriever = store, embedder, retriever
+        symbol_router = SymbolRouter(store)
+        rag_pipeline = pipeline
+        startup_seconds.labels(stage="init").set(time.perf_counter() - started)
+    return rag_pipeline
+
 
-prompt_node = OpenAIGenerator(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    model="gpt-3.5-turbo",
-    generation_kwargs={"max_tokens": 500}
-)
+def warm_up():
+    """
+    init(), then run one embedding and one store round trip so the first query pays no startup cost.
+    """
+    global _ready
+    started = time.perf_counter()
+    init()
+    rag_pipeline.warm_up()
+    query_embedder.run(text="warm up")
+    document_store.count_documents()
+    _ready = True
+    pipeline_ready.set(1)
+    startup_seconds.labels(stage="warm_up").set(time.perf_counter() - started)
 
-rag_pipeline = Pipeline()
-rag_pipeline.add_component("bm25_retriever", bm25_retriever)
-rag_pipeline.add_component("embedding_retriever", embedding_retriever)
-rag_pipeline.add_component("prompt_builder", prompt_builder)
-rag_pipeline.add_component("llm", prompt_node)
 
-rag_pipeline.connect("bm25_retriever.documents", "embedding_retriever.documents")
-rag_pipeline.connect("embedding_retriever.documents", "prompt_builder.documents")
-rag_pipeline.connect("prompt_builder.prompt", "llm.prompt")
+def is_ready():
+    return _ready
+
+
+def warm_up_in_background():
+    """Run warm_up() on a daemon thread, retrying every WARMUP_RETRY_SECONDS until it succeeds."""
+    def run():
+        while True:
+            try:
+                warm_up()
+                logger.info("RAG pipeline ready")
+                return
+            except Exception as e:
+                logger.warning(f"RAG pipeline warm-up failed, retrying in {WARMUP_RETRY_SECONDS}s: {e}")
+                time.sleep(WARMUP_RETRY_SECONDS)
+    thread = threading.Thread(target=run, name="rag-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def embed_query(question):
+    # Through the batching embedder, so the retriever finds this vector in its LRU
+    init()
+    return unit_vector(query_embedder.run(text=question)["embedding"])
+
+
+def lookup_cached_answer(question, epoch):
+    """Return (cached answer or None, query vector or None) for the current ingestion epoch."""
+    answer = answer_cache.get(question, epoch)
+    if answer is not None:
+        cache_hits.labels(kind="exact").inc()
+        return answer, None
+    vector = None
+    if ANSWER_CACHE_SIMILARITY > 0:
+        vector = embed_query(question)
+        answer = answer_cache.find_similar(
+            vector, epoch, ANSWER_CACHE_SIMILARITY)
+        if answer is not None:
+            cache_hits.labels(kind="similar").inc()
+            return answer, vector
+    cache_misses.inc()
+    return None, vector
+
+
+def _timed_callback(streaming_callback, started):
+    """Wrap a streaming callback so the first chunk is recorded in the TTFT histogram."""
+    first = [True]
+
+    def callback(chunk: StreamingChunk):
+        if first[0] and chunk.content:
+            first[0] = False
+            time_to_first_token.observe(time.perf_counter() - started)
+        streaming_callback(chunk)
+    return callback
+
+
+def run_pipeline(question, history="", streaming_callback=None, coins=None):
+    init()
+    if coins is None:
+        coins = symbol_router.detect(question)
+    data = {
+        "retriever": {"query": question, "top_k": RETRIEVAL_TOP_K,
+                      "filters": symbol_router.filters(coins)},
+        "context_packer": {"pinned_documents": symbol_router.latest_market_documents(coins)},
+        "prompt_builder": {"question": question, "history": history}
+    }
+    if streaming_callback is not None:
+        data["llm"] = {"streaming_callback": streaming_callback}
+    with sentry_sdk.start_transaction(op="rag.query", name="rag_pipeline.query"):
+        result = rag_pipeline.run(data=data, include_outputs_from={"retriever", "prompt_builder"})
+    record_context(result.get("retriever", {}).get("documents"),
+                   result.get("prompt_builder", {}).get("prompt"))
+    record_generation(result["llm"].get("meta"))
+    return result["llm"]["replies"][0]
+
+
+def run_coalesced(question, epoch, streaming_callback=None, correlation_id="", coins=None):
+    """
+    run_pipeline() shared between concurrent callers asking the same question in the same epoch.
+
+    The first caller runs the pipeline and publishes its streamed chunks; the others
+    wait for it, replaying those chunks to their own callbacks, and get the same
+    answer (or exception). Followers only get a single final chunk if the leader
+    was not streaming.
+    """
+    key = (normalize_question(question), epoch)
+    flight, leader = inflight_queries.join(key)
+    if not leader:
+        query_coalesced.inc()
+        logger.info(f"Joining in-flight query for '{key[0]}' [CID: {correlation_id}]")
+        streamed = [False]
+
+        def replay(chunk):
+            streamed[0] = True
+            streaming_callback(chunk)
+        answer = flight.wait(replay if streaming_callback is not None else None)
+        if streaming_callback is not None and not streamed[0]:
+            streaming_callback(StreamingChunk(content=answer))
+        return answer
+
+    def publish(chunk: StreamingChunk):
+        flight.publish(chunk)
+        streaming_callback(chunk)
+    try:
+        answer = run_pipeline(question, streaming_callback=publish if streaming_callback is not None else None,
+                              coins=coins)
+    except Exception as e:
+        inflight_queries.finish(key, flight, error=e)
+        raise
+    inflight_queries.finish(key, flight, result=answer)
+    return answer
 
-def query(question):
+
+def _deliver(question, answer, streaming_callback, session_id):
+    """Hand back an answer that did not come from the LLM: remember it and stream it as one chunk."""
+    if session_id:
+        session_memory.update(session_id, question, answer)
+    if streaming_callback is not None:
+        streaming_callback(StreamingChunk(content=answer))
+    return answer
+
+
+def query(question, streaming_callback=None, session_id=None, raise_errors=False):
+    """
+    Answer a question with the RAG pipeline.
+
+    Args:
+        question (str): The user's question.
+        streaming_callback (callable, optional): Receives each StreamingChunk as
+            the LLM produces it; a cached or digest answer is delivered as a single chunk.
+        session_id (str, optional): Conversation to continue. Its recent turns go
+            into the prompt and the new exchange is remembered; answers that
+            depend on history bypass the answer cache.
+        raise_errors (bool): Re-raise a pipeline failure (after logging it) instead of
+            returning an apology, e.g. so a stream cut off mid-answer can report the error.
+    """
     correlation_id = str(uuid.uuid4())
     logger.configure(extra={"correlation_id": correlation_id})
     try:
         logger.info(f"Running query: {question} [CID: {correlation_id}]")
         query_count.inc()
         with query_latency.time():
-            result = rag_pipeline.run(
-                data={
-                    "bm25_retriever": {"query": question, "top_k": 10},
-                    "embedding_retriever": {"query": question, "top_k": 10},
-                    "prompt_builder": {"question": question}
-                }
-            )
-        answer = result["llm"]["replies"][0]
+            started = time.perf_counter()
+            if streaming_callback is not None:
+                streaming_callback = _timed_callback(
+                    streaming_callback, started)
+            history = session_memory.get_context(session_id) if session_id else ""
+            init()
+            coins = symbol_router.detect(question)
+            answer = digest_router.answer(question, coins)
+            if answer is not None:
+                logger.info(f"Answered from market digest [CID: {correlation_id}]")
+                return _deliver(question, answer, streaming_callback, session_id)
+            epoch = get_ingestion_epoch()
+            # Without a known epoch a cached answer may predate the last ingestion
+            cacheable = not history and epoch is not None
+            answer, vector = lookup_cached_answer(question, epoch) if cacheable else (None, None)
+            if answer is not None:
+                logger.info(
+                    f"Answer cache hit (epoch {epoch}) [CID: {correlation_id}]")
+                return _deliver(question, answer, streaming_callback, session_id)
+            if history:
+                answer = run_pipeline(question, history, streaming_callback, coins)
+            else:
+                answer = run_coalesced(question, epoch, streaming_callback, correlation_id, coins)
+                if cacheable and not is_degraded(answer):
+                    answer_cache.put(question, epoch, answer, vector)
+            if session_id:
+                session_memory.update(session_id, question, answer)
         logger.info(f"RAG response: {answer} [CID: {correlation_id}]")
         return answer
     except Exception as e:
         logger.exception(f"Error in RAG query pipeline [CID: {correlation_id}]")
         sentry_sdk.capture_exception(e)
-        return "Sorry, I encountered an error while generating a response. Please try again."
\ No newline at end of file
+        if raise_errors:
+            raise
+        return "Sorry, I encountered an error while generating a response. Please try again."
+
+
+class QueryOverloadedError(RuntimeError):
+    """Raised when QUERY_MAX_CONCURRENCY + QUERY_MAX_QUEUE queries are already admitted."""
+
+
+_query_executor = ThreadPoolExecutor(
+    max_workers=QUERY_MAX_CONCURRENCY, thread_name_prefix="rag-query")
+_admitted = 0
+_admission_lock = threading.Lock()
+
+
+def _admit():
+    global _admitted
+    with _admission_lock:
+        if _admitted >= QUERY_MAX_CONCURRENCY + QUERY_MAX_QUEUE:
+            query_rejected.inc()
+            raise QueryOverloadedError("Too many queries in flight")
+        _admitted += 1
+        query_inflight.inc()
+
+
+def _release(_future=None):
+    global _admitted
+    with _admission_lock:
+        _admitted -= 1
+        query_inflight.dec()
+
+
+async def aquery(question, session_id=None):
+    """
+    Non-blocking variant of query() for the async front ends.
+
+    The pipeline runs on a bounded thread pool so the event loop keeps serving
+    other clients; a slot is held until the pipeline run itself finishes, even
+    if the awaiting client goes away.
+
+    Raises:
+        QueryOverloadedError: If the executor and its queue are full.
+    """
+    _admit()
+    try:
+        future = _query_executor.submit(query, question, session_id=session_id)
+    except Exception:
+        _release()
+        raise
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+_STREAM_END = object()
+
+
+def _stream_into(question, emit, session_id=None):
+    """
+    Run query() with a callback that forwards tokens to emit(); falls back to the full answer.
+
+    A pipeline failure is raised rather than answered with an apology, since part of
+    the answer may already have been sent.
+    """
+    streamed = [False]
+
+    def callback(chunk: StreamingChunk):
+        if chunk.content:
+            streamed[0] = True
+            emit(chunk.content)
+    try:
+        answer = query(question, streaming_callback=callback, session_id=session_id, raise_errors=True)
+        if not streamed[0]:
+            emit(answer)
+    finally:
+        emit(_STREAM_END)
+
+
+def stream_query(question, session_id=None):
+    """
+    Start a streamed query and return a blocking iterator over its answer tokens,
+    for Streamlit's write_stream.
+
+    Admission is the same as for aquery() and astream_query() and happens immediately.
+
+    Raises:
+        QueryOverloadedError: If the executor and its queue are full.
+    """
+    tokens = queue.Queue()
+    _admit()
+    try:
+        future = _query_executor.submit(_stream_into, question, tokens.put, session_id)
+    except Exception:
+        _release()
+        raise
+    future.add_done_callback(_release)
+
+    def iterate():
+        while True:
+            token = tokens.get()
+            if token is _STREAM_END:
+                break
+            yield token
+        future.result()
+    return iterate()
+
+
+def astream_query(question, session_id=None):
+    """
+    Start a streamed query and return an async iterator over its answer tokens.
+
+    Admission happens immediately (not on first iteration), so callers can still
+    turn a QueryOverloadedError into a 429 before sending any response.
+
+    Raises:
+        QueryOverloadedError: If the executor and its queue are full.
+    """
+    loop = asyncio.get_running_loop()
+    tokens = asyncio.Queue()
+    _admit()
+    try:
+        future = _query_executor.submit(
+            _stream_into, question, lambda token: loop.call_soon_threadsafe(tokens.put_nowait, token), session_id)
+    except Exception:
+        _release()
+        raise
+    future.add_done_callback(_release)
+
+    async def iterate():
+        while True:
+            token = await tokens.get()
+            if token is _STREAM_END:
+                break
+            yield token
+        # Re-raise a pipeline failure so the caller can report it instead of ending cleanly
+        await asyncio.wrap_future(future)
+    return iterate()
+
+
+startup_seconds.labels(stage="import").set(time.perf_counter() - _import_started)
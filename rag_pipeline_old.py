@@ -9,10 +9,11 @@ from haystack.components.builders import PromptBuilder
 from haystack import Pipeline
 from loguru import logger
 import sentry_sdk
+from observability import init_sentry
 from prometheus_client import Counter, Histogram
 
 # Initialize Sentry for error tracking
-sentry_sdk.init(dsn=os.getenv("SENTRY_DSN", ""), traces_sample_rate=1.0)
+init_sentry()
 
 # Metrics
 query_count = Counter("rag_query_total", "Total number of queries processed")
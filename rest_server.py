@@ -1,18 +1,28 @@
 from fastapi import FastAPI, Request, Header, HTTPException
 from pydantic import BaseModel
-from rag_pipeline import query
+from typing import Optional
+from contextlib import asynccontextmanager
+from rag_pipeline import QueryOverloadedError, aquery, astream_query, is_ready, warm_up_in_background
 from loguru import logger
 import os
+import json
 import uuid
-from prometheus_client import Counter, Histogram
-from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Metrics
 api_requests = Counter("api_requests_total", "Total number of API requests")
 api_latency = Histogram("api_latency_seconds", "API request latency")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Serve /health (and report not ready) while the pipeline warms up
+    warm_up_in_background()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,12 +34,14 @@ API_KEY = os.getenv("REST_API_KEY", "changeme")
 
 class QueryRequest(BaseModel):
     question: str
+    # Clients pass the same session_id on follow-up questions to keep conversation memory
+    session_id: Optional[str] = None
 
 @app.middleware("http")
 async def authenticate(request: Request, call_next):
     correlation_id = str(uuid.uuid4())
     logger.configure(extra={"correlation_id": correlation_id})
-    if request.url.path == "/health":
+    if request.url.path in ("/health", "/ready", "/metrics"):
         return await call_next(request)
     token = request.headers.get("X-API-KEY")
     if token != API_KEY:
@@ -41,6 +53,22 @@ async def authenticate(request: Request, call_next):
 def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness_check():
+    # Unlike /health, only succeeds once queries can be answered without startup delay
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+@app.get("/metrics")
+def metrics():
+    # Under gunicorn every worker has its own registry; aggregate their files instead
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/query")
 async def ask(req: QueryRequest):
     correlation_id = str(uuid.uuid4())
@@ -48,5 +76,37 @@ async def ask(req: QueryRequest):
     api_requests.inc()
     with api_latency.time():
         logger.info(f"REST query: {req.question} [CID: {correlation_id}]")
-        response = query(req.question)
-    return JSONResponse(content={"response": response})
\ No newline at end of file
+        try:
+            response = await aquery(req.question, session_id=req.session_id)
+        except QueryOverloadedError:
+            logger.warning(f"Query rejected, server busy [CID: {correlation_id}]")
+            return JSONResponse(status_code=429, headers={"Retry-After": "1"},
+                                content={"detail": "Too many concurrent queries, please retry shortly."})
+    return JSONResponse(content={"response": response})
+
+@app.post("/query/stream")
+async def ask_stream(req: QueryRequest):
+    correlation_id = str(uuid.uuid4())
+    logger.configure(extra={"correlation_id": correlation_id})
+    api_requests.inc()
+    logger.info(f"REST stream query: {req.question} [CID: {correlation_id}]")
+    try:
+        tokens = astream_query(req.question, session_id=req.session_id)
+    except QueryOverloadedError:
+        logger.warning(f"Query rejected, server busy [CID: {correlation_id}]")
+        return JSONResponse(status_code=429, headers={"Retry-After": "1"},
+                            content={"detail": "Too many concurrent queries, please retry shortly."})
+
+    async def events():
+        with api_latency.time():
+            try:
+                async for token in tokens:
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+            except Exception as e:
+                logger.error(f"Stream query failed: {e} [CID: {correlation_id}]")
+                yield f"event: error\ndata: {json.dumps({'detail': 'The answer could not be completed, please retry.'})}\n\n"
+                return
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
\ No newline at end of file
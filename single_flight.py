@@ -0,0 +1,82 @@
+import threading
+
+
+class Flight:
+    """
+    One in-flight computation shared by a leader and any number of followers.
+
+    The leader publishes intermediate items (e.g. streamed tokens) and then
+    finishes with a result or an error; followers replay everything published so
+    far, keep receiving new items, and end with the same result or error.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.items = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+    def publish(self, item):
+        with self.cond:
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def _complete(self, result=None, error=None):
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+    def wait(self, on_item=None):
+        """
+        Block until the leader finishes, passing each published item to on_item.
+
+        Raises:
+            Exception: Whatever the leader failed with.
+        """
+        seen = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.done or len(self.items) > seen)
+                pending = self.items[seen:]
+                seen = len(self.items)
+                done = self.done
+            if on_item is not None:
+                for item in pending:
+                    on_item(item)
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Registry that lets concurrent callers with the same key share one Flight."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def join(self, key):
+        """
+        Returns:
+            tuple: (flight, True) for the caller that must run the work, (flight, False) for followers.
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = self.flights[key] = Flight()
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        # Unregister first so callers arriving from now on start a fresh flight
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight._complete(result, error)
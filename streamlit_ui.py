@@ -1,24 +1,33 @@
 import streamlit as st
-from rag_pipeline import query
-from model_context import ConversationMemory
+from rag_pipeline import QueryOverloadedError, session_memory, stream_query, warm_up_in_background
 from loguru import logger
 import uuid
 
 st.set_page_config(page_title="Crypto RAG Agent", layout="wide")
+
+@st.cache_resource
+def start_pipeline():
+    # Once per server process, not on every rerun
+    return warm_up_in_background()
+
+start_pipeline()
 st.title("💹 Crypto Trading Expert Agent")
 
-# Initialize session state for conversation memory
-if "memory" not in st.session_state:
-    st.session_state.memory = ConversationMemory()
+# Each browser session is one conversation in the shared session memory
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
 
 query_input = st.text_input("Enter your question about crypto trading")
 if query_input:
     correlation_id = str(uuid.uuid4())
     logger.configure(extra={"correlation_id": correlation_id})
-    with st.spinner("Thinking like a pro trader..."):
-        logger.info(f"UI query: {query_input} [CID: {correlation_id}]")
-        response = query(query_input)
-        st.session_state.memory.update(query_input, response)
-        st.markdown(f"**💬 Response:**\n\n{response}")
-        st.markdown("**📜 Conversation History:**")
-        st.text(st.session_state.memory.get_context())
\ No newline at end of file
+    logger.info(f"UI query: {query_input} [CID: {correlation_id}]")
+    st.markdown("**💬 Response:**")
+    # Tokens are rendered as the LLM produces them; the exchange is remembered by the pipeline
+    try:
+        st.write_stream(stream_query(query_input, session_id=st.session_state.session_id))
+    except QueryOverloadedError:
+        logger.warning(f"Query rejected, server busy [CID: {correlation_id}]")
+        st.error("Too many concurrent queries, please retry shortly.")
+    st.markdown("**📜 Conversation History:**")
+    st.text(session_memory.get_context(st.session_state.session_id))
@@ -0,0 +1,209 @@
+import os
+import json
+import threading
+from collections import deque
+from typing import Dict, List
+import redis
+from loguru import logger
+from prometheus_client import Counter
+from answer_cache import REDIS_URL, get_ingestion_epoch
+
+# Metrics
+symbol_routing = Counter("rag_symbol_routing_total",
+                         "Queries by whether a coin was detected in the question", ["outcome"])
+
+SYMBOL_INDEX_PATH = os.getenv("SYMBOL_INDEX_PATH", "./data/symbol_index.json")
+SYMBOL_INDEX_KEY = "rag:symbol_index"
+
+# Tickers that are also everyday words only count when written in capitals ("ONE", not "one")
+AMBIGUOUS_TICKERS = {
+    "a", "ai", "all", "am", "an", "and", "any", "are", "as", "at", "be", "best", "big", "but",
+    "buy", "by", "can", "cat", "do", "dog", "for", "fun", "gas", "get", "go", "good", "has",
+    "hot", "i", "if", "in", "is", "it", "key", "low", "max", "me", "my", "new", "not", "now",
+    "of", "on", "one", "or", "out", "pay", "rsi", "s", "sell", "so", "sun", "the", "to", "top",
+    "trump", "up", "us", "we", "win", "x", "you",
+}
+
+_redis = redis.Redis.from_url(
+    REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: finds every occurrence of any pattern in one pass over the text.
+
+    Matches are reported only on word boundaries, so "sol" does not match inside "solid".
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(pattern)
+        # Breadth-first pass to link every state to its longest proper suffix state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """
+        Returns:
+            list: (start, end, pattern) for each whole-word occurrence, in order of end position.
+        """
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern in self.output[state]:
+                start = i - len(pattern) + 1
+                before = text[start - 1] if start > 0 else " "
+                after = text[i + 1] if i + 1 < len(text) else " "
+                if not before.isalnum() and not after.isalnum():
+                    matches.append((start, i + 1, pattern))
+        return matches
+
+
+class SymbolIndex:
+    """
+    Maps tickers, CoinGecko slugs and coin names to coins, and detects them in questions.
+
+    Built from fetch_top_50_symbols() output: [{"symbol", "slug", "name"}, ...].
+    """
+
+    def __init__(self, coins: List[Dict[str, str]]):
+        self.coins = [{"symbol": c["symbol"].upper(), "slug": c["slug"], "name": c.get("name") or c["slug"]}
+                      for c in coins]
+        self.aliases = {}
+        for coin in self.coins:
+            ticker = coin["symbol"].lower()
+            # Names and slugs win over another coin's identical ticker
+            for alias in (coin["slug"], coin["slug"].replace("-", " "), coin["name"].lower()):
+                self.aliases[alias] = (coin, False)
+            self.aliases.setdefault(ticker, (coin, ticker in AMBIGUOUS_TICKERS))
+        self.matcher = AhoCorasick(self.aliases)
+
+    def detect(self, question: str) -> List[Dict[str, str]]:
+        """Coins named in the question, in order of first mention."""
+        found = {}
+        for start, end, alias in self.matcher.find(question.lower()):
+            coin, needs_capitals = self.aliases[alias]
+            if needs_capitals and not question[start:end].isupper():
+                continue
+            found.setdefault(coin["symbol"], (start, coin))
+        return [coin for _, coin in sorted(found.values(), key=lambda item: item[0])]
+
+    def to_json(self):
+        return json.dumps(self.coins)
+
+
+def publish_symbol_index(coins):
+    """Persist the index built from the latest coin list to Redis and SYMBOL_INDEX_PATH."""
+    payload = SymbolIndex(coins).to_json()
+    try:
+        _redis.set(SYMBOL_INDEX_KEY, payload)
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish symbol index to Redis: {e}")
+    directory = os.path.dirname(SYMBOL_INDEX_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{SYMBOL_INDEX_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(payload)
+    os.replace(tmp_path, SYMBOL_INDEX_PATH)
+
+
+def load_symbol_index():
+    """Load the published index from Redis, falling back to the local file; None if neither exists."""
+    payload = None
+    try:
+        payload = _redis.get(SYMBOL_INDEX_KEY)
+    except redis.RedisError:
+        pass
+    if payload is None and os.path.exists(SYMBOL_INDEX_PATH):
+        with open(SYMBOL_INDEX_PATH, "r", encoding="utf-8") as f:
+            payload = f.read()
+    return SymbolIndex(json.loads(payload)) if payload else None
+
+
+class SymbolRouter:
+    """
+    Turns coins named in a question into retrieval filters and pinned market documents.
+
+    The index is reloaded, and the market document cache cleared, whenever the
+    ingestion epoch changes.
+    """
+
+    def __init__(self, document_store):
+        self.document_store = document_store
+        self.lock = threading.Lock()
+        # No epoch read yet; get_ingestion_epoch() returns None while Redis is unreachable,
+        # in which case the table is loaded once and kept until the epoch is known again
+        self.epoch = -1
+        self.index = None
+        self.market_documents = {}
+
+    def _refresh(self):
+        epoch = get_ingestion_epoch()
+        if epoch == self.epoch:
+            return
+        with self.lock:
+            if epoch == self.epoch:
+                return
+            try:
+                self.index = load_symbol_index()
+            except Exception as e:
+                logger.warning(f"Could not load symbol index: {e}")
+            self.market_documents = {}
+            self.epoch = epoch
+
+    def detect(self, question: str) -> List[Dict[str, str]]:
+        self._refresh()
+        coins = self.index.detect(question) if self.index is not None else []
+        symbol_routing.labels(outcome="matched" if coins else "unmatched").inc()
+        return coins
+
+    @staticmethod
+    def filters(coins):
+        """
+        Filters keeping market documents of the detected coins plus every document
+        that is not a market snapshot (no `symbol` in meta), e.g. ingested docs.
+        """
+        if not coins:
+            return None
+        return {"operator": "OR", "conditions": [
+            {"field": "meta.symbol", "operator": "in", "value": [c["symbol"] for c in coins]},
+            {"field": "meta.slug", "operator": "in", "value": [c["slug"] for c in coins]},
+            {"field": "meta.symbol", "operator": "==", "value": None},
+        ]}
+
+    def latest_market_documents(self, coins):
+        """Most recent market snapshot for each coin, looked up once per ingestion epoch."""
+        documents = []
+        for coin in coins:
+            symbol = coin["symbol"]
+            if symbol not in self.market_documents:
+                snapshots = self.document_store.filter_documents(
+                    {"field": "meta.symbol", "operator": "==", "value": symbol})
+                self.market_documents[symbol] = max(
+                    snapshots, key=lambda d: d.meta.get("updated_at") or 0, default=None)
+            if self.market_documents[symbol] is not None:
+                documents.append(self.market_documents[symbol])
+        return documents
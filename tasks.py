@@ -1,29 +1,228 @@
 import os
+import time
 import uuid
 import traceback
-from celery import Celery
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from celery import Celery, chord
 from loguru import logger
 import requests
 from ingest_sources.ingest_coingecko import fetch_top_50_symbols
 from ingest_sources.ingest_binance import fetch_technical_data
-from ingest_sources.ingest_sentiment import fetch_sentiment
-from haystack_integrations.document_stores.weaviate import WeaviateDocumentStore
+from ingest_sources.ingest_sentiment import fetch_sentiment, fetch_sentiment_batch
 from haystack import Document
-from prometheus_client import Counter, Histogram
+from haystack.document_stores.types import DuplicatePolicy
+from indicators import compute_indicator_table, format_indicators
+from kline_sync import kline_sync
+from answer_cache import bump_ingestion_epoch
+from symbol_index import publish_symbol_index
+from market_history import record_market_history
+from market_digest import publish_digests
+from document_stores import create_document_store
+from prometheus_client import Counter, Gauge, Histogram
 
 # Metrics
 ingestion_count = Counter("ingestion_tasks_total",
                           "Total number of ingestion tasks")
 ingestion_latency = Histogram(
-    "ingestion_latency_seconds", "Ingestion task latency")
+    "ingestion_latency_seconds", "Ingestion run latency, from the start of the run to its documents being written")
+ingestion_documents = Counter("ingestion_documents_total",
+                              "Total number of market documents ingested")
+ingestion_failures = Counter("ingestion_symbol_failures_total",
+                             "Total number of symbols that failed to ingest")
+snapshots_compacted = Counter("market_snapshots_compacted_total",
+                              "Superseded market snapshots deleted by compaction")
+ingestion_throughput = Gauge(
+    "ingestion_throughput_symbols_per_second",
+    "Symbols ingested per second during the last ingestion run")
 
-store = WeaviateDocumentStore(url="http://localhost:8080")
+# Max number of symbols fetched in parallel; 1 restores sequential ingestion
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", 8))
+# Kline intervals summarised into each market document
+INDICATOR_INTERVALS = [i.strip() for i in os.getenv(
+    "INDICATOR_INTERVALS", "5m,1h,4h,1d").split(",") if i.strip()]
+# "full" refetches a 100-candle window per run, "incremental" syncs only new candles
+KLINE_SYNC_MODE = os.getenv("KLINE_SYNC_MODE", "full")
+# "chord" fans out one Celery task per symbol; "local" fetches all symbols in this task's thread pool
+INGEST_FANOUT = os.getenv("INGEST_FANOUT", "chord")
+# Seconds between scheduled ingestions run by celery beat; 0 disables the schedule
+INGEST_SCHEDULE_SECONDS = float(os.getenv("INGEST_SCHEDULE_SECONDS", 300))
+SYMBOL_MAX_RETRIES = int(os.getenv("SYMBOL_MAX_RETRIES", 3))
+SYMBOL_RETRY_BACKOFF = float(os.getenv("SYMBOL_RETRY_BACKOFF", 10))
+# Seconds between compactions of superseded market snapshots; 0 disables the schedule
+COMPACTION_SCHEDULE_SECONDS = float(os.getenv("COMPACTION_SCHEDULE_SECONDS", 3600))
+# Current snapshots not refreshed for this long (coins that left the top 50) are compacted away
+MARKET_SNAPSHOT_MAX_AGE = float(os.getenv("MARKET_SNAPSHOT_MAX_AGE", 86400))
 
-app = Celery("tasks", broker=os.getenv(
-    "CELERY_BROKER_URL", "redis://redis:6379/0"))
+store = create_document_store()
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
+# Chords need a result backend to collect the per-symbol results
+app = Celery("tasks", broker=CELERY_BROKER_URL,
+             backend=os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL))
 app.conf.task_serializer = "json"
 app.conf.result_serializer = "json"
 app.conf.accept_content = ["json"]
+app.conf.result_expires = 3600
+app.conf.beat_schedule = {}
+if INGEST_SCHEDULE_SECONDS > 0:
+    app.conf.beat_schedule["ingest-market-data"] = {
+        "task": "tasks.ingest_all_data",
+        "schedule": INGEST_SCHEDULE_SECONDS,
+        # A run that could not start before the next one is due is dropped
+        "options": {"expires": INGEST_SCHEDULE_SECONDS},
+    }
+if COMPACTION_SCHEDULE_SECONDS > 0:
+    app.conf.beat_schedule["compact-market-snapshots"] = {
+        "task": "tasks.compact_market_snapshots",
+        "schedule": COMPACTION_SCHEDULE_SECONDS,
+        "options": {"expires": COMPACTION_SCHEDULE_SECONDS},
+    }
+
+
+def market_snapshot_id(symbol):
+    """Stable id of a coin's live market snapshot, so each ingestion overwrites it in place."""
+    return f"market-snapshot:{symbol}"
+
+
+def fetch_coin_indicators(coin):
+    """Indicator summaries for one coin, {interval: summary}, fetched and computed on their own."""
+    if KLINE_SYNC_MODE == "incremental":
+        indicators = {}
+        for interval in INDICATOR_INTERVALS:
+            summary = kline_sync.sync(coin["symbol"], interval)
+            if summary is not None:
+                indicators[interval] = summary
+        return indicators
+    klines = {interval: fetch_technical_data(coin["symbol"], interval)
+              for interval in INDICATOR_INTERVALS}
+    return compute_indicator_table({coin["symbol"]: klines})[coin["symbol"]]
+
+
+def fetch_sentiments(coins, correlation_id):
+    """Sentiment for all coins via batched Santiment queries; {} if the batch fails altogether."""
+    try:
+        return fetch_sentiment_batch([coin["slug"] for coin in coins])
+    except Exception as e:
+        logger.warning(f"Batched sentiment fetch failed, falling back per symbol: {e} [CID: {correlation_id}]")
+        return {}
+
+
+def fetch_coin_data(coin, sentiment=None):
+    """Indicators and sentiment for one coin; the same steps ingest_symbol runs per chord task."""
+    indicators = fetch_coin_indicators(coin)
+    if sentiment is None:
+        sentiment = fetch_sentiment(coin["slug"])
+    return {"coin": coin, "indicators": indicators, "sentiment": sentiment}
+
+
+def build_coin_document(coin, indicators, sentiment):
+    symbol = coin["symbol"]
+    slug = coin["slug"]
+    return Document(
+        id=market_snapshot_id(symbol),
+        content=(f"{symbol} ({slug}) technicals and sentiment\n"
+                 f"{format_indicators(indicators)}\n"
+                 + " ".join(f"{key}={value}" for key, value in sentiment.items())),
+        meta={
+            "symbol": symbol,
+            "slug": slug,
+            "indicators": indicators,
+            "sentiment": sentiment,
+            "updated_at": int(time.time()),
+        }
+    )
+
+
+def build_coin_documents(coins, correlation_id):
+    fetched = []
+    sentiments = fetch_sentiments(coins, correlation_id)
+    with ThreadPoolExecutor(max_workers=max(1, INGEST_CONCURRENCY)) as executor:
+        futures = {executor.submit(fetch_coin_data, coin, sentiments.get(coin["slug"])): coin
+                   for coin in coins}
+        for future in as_completed(futures):
+            coin = futures[future]
+            try:
+                fetched.append(future.result())
+            except Exception as e:
+                ingestion_failures.inc()
+                logger.warning(
+                    f"Skipping {coin['symbol']}: {e} [CID: {correlation_id}]")
+    return [build_coin_document(item["coin"], item["indicators"], item["sentiment"]) for item in fetched]
+
+
+def publish_market_digests(documents, correlation_id):
+    """Post-ingestion stage: per-symbol digests that let queries skip the LLM for simple facts."""
+    try:
+        publish_digests(documents)
+    except Exception as e:
+        logger.warning(f"Could not publish market digests: {e} [CID: {correlation_id}]")
+
+
+class NoSymbolsIngested(RuntimeError):
+    """Every symbol of a run failed; retrying the write cannot fix that."""
+
+
+def write_coin_documents(documents, coins, started_at, correlation_id):
+    if coins and not documents:
+        raise NoSymbolsIngested("No symbols could be ingested")
+    # Published before the epoch bump so query processes reload the new index with it
+    publish_symbol_index(coins)
+    if documents:
+        # One live snapshot per coin, replaced in place; the values over time go to the history store
+        store.write_documents(documents, policy=DuplicatePolicy.OVERWRITE)
+        publish_market_digests(documents, correlation_id)
+        bump_ingestion_epoch()
+        record_market_history(documents, correlation_id)
+    elapsed = time.time() - started_at
+    # Observed here rather than around ingest_all_data, which only dispatches in chord mode
+    ingestion_latency.observe(elapsed)
+    ingestion_documents.inc(len(documents))
+    ingestion_throughput.set(len(documents) / elapsed)
+    logger.info(
+        f"Ingestion task completed successfully: {len(documents)}/{len(coins)} symbols "
+        f"in {elapsed:.2f}s [CID: {correlation_id}]")
+
+
+@app.task(bind=True, max_retries=SYMBOL_MAX_RETRIES)
+def ingest_symbol(self, coin, partial=None, correlation_id=""):
+    """
+    Fetch indicators and sentiment for one coin.
+
+    Steps that already succeeded are passed along in `partial`, so a retry only
+    repeats the failed upstream call. After the last retry the failure is
+    returned instead of raised so the chord callback still runs for the others.
+    """
+    partial = dict(partial or {})
+    try:
+        if "indicators" not in partial:
+            partial["indicators"] = fetch_coin_indicators(coin)
+        if "sentiment" not in partial:
+            partial["sentiment"] = fetch_sentiment(coin["slug"])
+        return {"coin": coin, **partial}
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            ingestion_failures.inc()
+            logger.warning(f"Skipping {coin['symbol']}: {e} [CID: {correlation_id}]")
+            return {"coin": coin, "error": str(e)}
+        logger.warning(f"Retrying {coin['symbol']} ({', '.join(sorted(partial)) or 'nothing'} done): "
+                       f"{e} [CID: {correlation_id}]")
+        raise self.retry(exc=e, countdown=SYMBOL_RETRY_BACKOFF * 2 ** self.request.retries,
+                         args=(), kwargs={"coin": coin, "partial": partial, "correlation_id": correlation_id})
+
+
+@app.task(bind=True, max_retries=3)
+def write_ingested_symbols(self, results, coins, started_at, correlation_id=""):
+    """Chord callback: bulk-write the documents of every symbol that was ingested."""
+    try:
+        documents = [build_coin_document(result["coin"], result["indicators"], result["sentiment"])
+                     for result in results if "error" not in result]
+        write_coin_documents(documents, coins, started_at, correlation_id)
+    except NoSymbolsIngested as e:
+        logger.error(f"Ingestion failed: {e} [CID: {correlation_id}]")
+        raise
+    except Exception as e:
+        logger.exception(f"Ingestion write failed: {e} [CID: {correlation_id}]")
+        raise self.retry(exc=e, countdown=60)
 
 
 @app.task(bind=True, max_retries=3)
@@ -32,29 +231,61 @@ def ingest_all_data(self):
     logger.configure(extra={"correlation_id": correlation_id})
     try:
         ingestion_count.inc()
-        with ingestion_latency.time():
-            logger.info(f"Starting ingestion task [CID: {correlation_id}]")
-            coins = fetch_top_50_symbols()
-            logger.info(
-                f"Fetched {len(coins)} top coins [CID: {correlation_id}]")
-            for coin in coins:
-                symbol = coin["symbol"]
-                slug = coin["slug"]
-                indicators = fetch_technical_data(symbol)
-                sentiment = fetch_sentiment(slug)
-                doc = Document(
-                    content=f"{symbol} technicals and sentiment",
-                    meta={
-                        "symbol": symbol,
-                        "slug": slug,
-                        "indicators": indicators,
-                        "sentiment": sentiment,
-                    }
-                )
-                store.write_documents([doc], policy="SKIP")
-            logger.info(
-                f"Ingestion task completed successfully [CID: {correlation_id}]")
+        logger.info(f"Starting ingestion task [CID: {correlation_id}]")
+        # Wall-clock so the chord callback on another worker can measure the whole run
+        started_at = time.time()
+        coins = fetch_top_50_symbols()
+        logger.info(
+            f"Fetched {len(coins)} top coins [CID: {correlation_id}]")
+        if INGEST_FANOUT == "chord":
+            # One batched Santiment request up front; symbols it missed fetch their own
+            sentiments = fetch_sentiments(coins, correlation_id)
+            chord(ingest_symbol.s(coin,
+                                  partial={"sentiment": sentiments[coin["slug"]]}
+                                  if coin["slug"] in sentiments else None,
+                                  correlation_id=correlation_id)
+                  for coin in coins)(
+                write_ingested_symbols.s(coins, started_at, correlation_id))
+            logger.info(f"Dispatched {len(coins)} symbol tasks [CID: {correlation_id}]")
+            return
+        documents = build_coin_documents(coins, correlation_id)
+        write_coin_documents(documents, coins, started_at, correlation_id)
     except Exception as e:
         error_msg = f"Ingestion failed: {str(e)} [CID: {correlation_id}]"
         logger.exception(error_msg)
         raise self.retry(exc=e, countdown=60)
+
+
+def compact_snapshots(now=None):
+    """
+    Delete market snapshots that are no longer the live one for their coin.
+
+    That covers documents written under content-derived ids before snapshots were
+    upserted in place, and live snapshots not refreshed within MARKET_SNAPSHOT_MAX_AGE.
+
+    Returns:
+        int: Number of documents deleted.
+    """
+    now = now if now is not None else time.time()
+    snapshots = store.filter_documents({"field": "meta.symbol", "operator": "!=", "value": None})
+    stale = [doc.id for doc in snapshots
+             if doc.id != market_snapshot_id(doc.meta.get("symbol"))
+             or (doc.meta.get("updated_at") or 0) < now - MARKET_SNAPSHOT_MAX_AGE]
+    if stale:
+        store.delete_documents(stale)
+        bump_ingestion_epoch()
+    snapshots_compacted.inc(len(stale))
+    return len(stale)
+
+
+@app.task(bind=True, max_retries=3)
+def compact_market_snapshots(self):
+    correlation_id = str(uuid.uuid4())
+    logger.configure(extra={"correlation_id": correlation_id})
+    try:
+        deleted = compact_snapshots()
+        logger.info(f"Compacted {deleted} superseded market snapshots [CID: {correlation_id}]")
+        return deleted
+    except Exception as e:
+        logger.exception(f"Snapshot compaction failed: {e} [CID: {correlation_id}]")
+        raise self.retry(exc=e, countdown=60)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Nothing listens on port 1, so Redis-backed features fail fast instead of waiting on DNS
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:1/0")
+os.environ.setdefault("REST_API_KEY", "test")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+from haystack.dataclasses import StreamingChunk
+import rag_pipeline
+import rest_server
+
+
+class NoCoins:
+    def detect(self, question):
+        return []
+
+
+@pytest.fixture
+def failing_llm(monkeypatch):
+    """Pipeline whose LLM streams one token and then fails."""
+    def run_coalesced(question, epoch, streaming_callback=None, correlation_id="", coins=None):
+        streaming_callback(StreamingChunk(content="Partial "))
+        raise RuntimeError("LLM stream dropped")
+
+    monkeypatch.setattr(rag_pipeline, "init", lambda: None)
+    monkeypatch.setattr(rag_pipeline, "symbol_router", NoCoins())
+    monkeypatch.setattr(rag_pipeline, "run_coalesced", run_coalesced)
+    monkeypatch.setattr(rest_server, "warm_up_in_background", lambda: None)
+
+
+def test_stream_query_raises_after_partial_answer(failing_llm):
+    tokens = []
+    with pytest.raises(RuntimeError, match="LLM stream dropped"):
+        for token in rag_pipeline.stream_query("Should I buy BTC now?"):
+            tokens.append(token)
+    assert tokens == ["Partial "]
+
+
+def test_sse_stream_sends_error_event(failing_llm):
+    with TestClient(rest_server.app) as client:
+        response = client.post("/query/stream", json={"question": "Should I buy BTC now?"},
+                               headers={"X-API-KEY": rest_server.API_KEY})
+    assert response.status_code == 200
+    assert 'data: {"token": "Partial "}' in response.text
+    assert "event: error" in response.text
+    assert "event: end" not in response.text
+
+
+def test_query_still_answers_with_apology(failing_llm):
+    assert rag_pipeline.query("Should I buy BTC now?").startswith("Sorry")
@@ -1,8 +1,9 @@
 import asyncio
 import websockets
 import os
+import json
 import uuid
-from rag_pipeline import query
+from rag_pipeline import QueryOverloadedError, aquery, astream_query, warm_up_in_background
 from loguru import logger
 from prometheus_client import Counter, Gauge
 
@@ -13,30 +14,59 @@ ws_messages = Counter("ws_messages_total", "Total number of WebSocket messages r
 WS_PORT = int(os.getenv("WS_PORT", 8765))
 WS_API_KEY = os.getenv("WS_API_KEY", "changeme")
 
-async def handler(websocket, path):
+async def stream_answer(websocket, message, session_id, correlation_id):
+    try:
+        tokens = astream_query(message, session_id=session_id)
+    except QueryOverloadedError:
+        logger.warning(f"WS query rejected, server busy [CID: {correlation_id}]")
+        await websocket.send(json.dumps({"type": "error", "data": "Server busy, please retry shortly."}))
+        return
+    try:
+        async for token in tokens:
+            await websocket.send(json.dumps({"type": "token", "data": token}))
+    except Exception as e:
+        logger.error(f"WS stream query failed: {e} [CID: {correlation_id}]")
+        await websocket.send(json.dumps({"type": "error", "data": "The answer could not be completed, please retry."}))
+        return
+    await websocket.send(json.dumps({"type": "end"}))
+
+async def handler(websocket):
     correlation_id = str(uuid.uuid4())
     logger.configure(extra={"correlation_id": correlation_id})
     try:
-        key = websocket.request_headers.get("X-API-KEY")
+        key = websocket.request.headers.get("X-API-KEY")
         if key != WS_API_KEY:
             await websocket.send("Unauthorized")
             logger.warning(f"Unauthorized WebSocket connection [CID: {correlation_id}]")
             return
+        # Clients sending "X-STREAM: true" get JSON token frames instead of one reply per question
+        streaming = websocket.request.headers.get("X-STREAM", "").lower() in ("1", "true", "yes")
+        # Each connection is a conversation; "X-SESSION-ID" resumes an earlier one
+        session_id = websocket.request.headers.get("X-SESSION-ID") or correlation_id
         ws_connections.inc()
         await websocket.send("Connected. Ask your question.")
         async for message in websocket:
             ws_messages.inc()
             logger.info(f"WS received: {message} [CID: {correlation_id}]")
-            response = query(message)
+            if streaming:
+                await stream_answer(websocket, message, session_id, correlation_id)
+                continue
+            try:
+                response = await aquery(message, session_id=session_id)
+            except QueryOverloadedError:
+                logger.warning(f"WS query rejected, server busy [CID: {correlation_id}]")
+                response = "Server busy, please retry shortly."
             await websocket.send(response)
     except Exception as e:
         logger.error(f"WebSocket error: {e} [CID: {correlation_id}]")
     finally:
         ws_connections.dec()
 
-start_server = websockets.serve(handler, "0.0.0.0", WS_PORT, ssl=None)
+async def main():
+    warm_up_in_background()
+    async with websockets.serve(handler, "0.0.0.0", WS_PORT, ssl=None):
+        await asyncio.get_running_loop().create_future()
 
 if __name__ == "__main__":
     logger.info(f"Starting WebSocket server on port {WS_PORT}")
-    asyncio.get_event_loop().run_until_complete(start_server)
-    asyncio.get_event_loop().run_forever()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file